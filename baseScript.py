@@ -4,16 +4,32 @@
 Currancy rates script
 '''
 
-import urllib.request as rq
-from urllib.error import HTTPError
+import sys
+import http.client
+import threading
+import time
+import os
+import shutil
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from concurrent.futures import FIRST_COMPLETED
+import contextvars
+import importlib.util
+from urllib.parse import urlsplit
+from urllib.parse import urljoin
+from urllib.parse import unquote
+from collections import OrderedDict
+from collections import deque
+import mimetypes
+import io
+import html
 import json
 import argparse
 from datetime import datetime
 from datetime import timedelta
-import numpy as np
-import pandas as pd
-from matplotlib import pyplot as plt
-import jinja2
+import sqlite3
+from datetime import date
 from pathlib import Path
 
 description = '''
@@ -21,11 +37,13 @@ This script generates the financial report.
 We can pass as an argument:
    * currency name in Polish or currency code - script generate the report about this currency,
    * 'gold' - script generates the report about the price of gold,
-   * 'all' - script generates the report with the current table of currency rates.
+   * 'all' - script generates the report with the current table of currency rates,
+   * 'matrix' - script generates the report comparing all currencies of table A in the period.
 We can also pass the additional argument:
    * '-b dd-mm-yyyy' - the begin of the period,
    * '-e dd-mm-yyyy' - the end of the period.
 To check the available currencies you can use the '-l' option.
+Many reports can be generated in one run with the '--batch' or '--jobFile' option.
 Every word in the multi-word currency name has to be separated by '_'.
 Data for currencies are available from 02-01-2002.
 Data for price of gold are available from 02-01-2013.
@@ -39,49 +57,254 @@ def parserFunction():
     
     group = parser.add_mutually_exclusive_group()
     group.add_argument('-l', '--listOfCurrencies', action='store_true', help=u'''Prints the list of available currencies''')
-    parser.add_argument('-b', '--beginDate', type=lambda s: datetime.strptime(s +  " {:d}".format(datetime.now().hour), '%d-%m-%Y %H'), default=datetime.now(), help=u'''The first date when we need the currency rate.''')
-    parser.add_argument('-e', '--endDate', type=lambda s: datetime.strptime(s + " {:d}".format(datetime.now().hour), '%d-%m-%Y %H'), default=datetime.now(), help=u'''The last date when we need the currency rate.''')    
+    group.add_argument('--serve', action='store_true', help=u'''Starts the local HTTP server, which generates the reports on request.''')
+    group.add_argument('--backfill', action='store_true', help=u'''Downloads the whole history of all currencies and of gold to the archive in setup directory.''')
+    group.add_argument('--batch', nargs='+', metavar='ARGUMENT', help=u'''Generates the reports of all given currencies or options in one run.''')
+    parser.add_argument('--update', action='store_true', help=u'''Adds the fixings published since the last run to the archive and generates again only the reports of '--batch' and '--jobFile' whose data changed. It's meant to be run every day after 16:00, e.g. by cron.''')
+    parser.add_argument('--jobFile', help=u'''File with one report per line: currency name, currency code or option, optionally followed by the begin and the end date of the period.''')
+    parser.add_argument('-b', '--beginDate', type=parseDate, default=datetime.now(), help=u'''The first date when we need the currency rate.''')
+    parser.add_argument('-e', '--endDate', type=parseDate, default=datetime.now(), help=u'''The last date when we need the currency rate.''')    
+    parser.add_argument('-o', '--outDir', help=u'''Directory of the report. By default it is the current directory or 'reports' in the batch mode.''')
+    parser.add_argument('-t', '--catalogTtl', type=int, default=0, help=u'''Number of seconds for which the list of currencies is kept on the disk. By default it is downloaded on every run.''')
+    parser.add_argument('--apiUrl', default=apiUrl, help=u'''Address of the data source. By default it is the NBP_API_URL variable or http://api.nbp.pl/api/.''')
+    parser.add_argument('-w', '--workers', type=int, default=4, help=u'''Number of parallel downloads.''')
+    parser.add_argument('--rateLimit', type=float, default=0, help=u'''Maximum number of requests per second. By default it isn't limited, except the '--backfill' option, which sends at most 5 requests per second.''')
+    parser.add_argument('--deadline', type=float, metavar='SECONDS', help=u'''Time limit of downloading the data of one report. Slow requests are sent again and the report is generated from the data downloaded in time and marked as partial.''')
+    parser.add_argument('--timeout', type=float, default=10.0, help=u'''Time limit of one request in seconds.''')
+    parser.add_argument('--retries', type=int, default=3, help=u'''Number of retries of the request, when the data source doesn't answer or answers with an error.''')
+    parser.add_argument('--charts', choices=['png', 'svg'], default='png', help=u'''Format of the figures: PNG images rendered by matplotlib or SVG written directly into the report.''')
+    parser.add_argument('--codes', nargs='+', metavar='CODE', help=u'''Currencies of the 'matrix' option. By default all currencies of table A.''')
+    parser.add_argument('--pageSize', type=int, default=0, help=u'''Number of rows on one page of the table. By default the whole table is on one page.''')
+    parser.add_argument('--sideFiles', action='store_true', help=u'''Saves the tables as csv files and the data of the report as json file in setup directory.''')
+    parser.add_argument('--noDecimation', action='store_true', help=u'''Draws every point of the long periods. By default the figures keep at most 1000 points chosen by the Largest-Triangle-Three-Buckets method.''')
+    parser.add_argument('--export', nargs='+', choices=['parquet', 'feather', 'ndjson'], metavar='FORMAT', help=u'''Saves the series, the monthly aggregates and the statistics of the report (or the table of all currencies) in the export directory in the given formats: parquet, feather or ndjson. Parquet and feather need the pyarrow module.''')
+    parser.add_argument('--stream', action='store_true', help=u'''Processes the series of the currency or gold in parts while the next parts are downloaded, so the memory doesn't grow with the length of the period.''')
+    parser.add_argument('--rebuild', action='store_true', help=u'''Generates all parts of the report, even if their data didn't change since the last run.''')
+    parser.add_argument('--chartProcesses', type=int, default=min(5, os.cpu_count() or 1), help=u'''Number of processes which render the figures of one report.''')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help=u'''Number of reports generated in parallel in the batch mode.''')
+    parser.add_argument('--profile', nargs='?', const='profile', metavar='DIRECTORY', help=u'''Saves the time of every stage of the script as summary.json and trace.json (for chrome://tracing or Perfetto) in the directory, by default 'profile'.''')
+    parser.add_argument('--cProfile', action='store_true', help=u'''Saves also the cProfile statistics of the script as cprofile.prof in the directory of '--profile'.''')
+    parser.add_argument('--port', type=int, default=8000, help=u'''Port of the server.''')
+    parser.add_argument('--cacheSize', type=int, default=32, help=u'''Number of reports kept in memory by the server.''')
     parser.add_argument('argument', nargs='?', default='all', type=str,  help=u'''Currency name in Polish, currency code or other available option.''')        
         
     args = parser.parse_args()
+    if args.export and ('parquet' in args.export or 'feather' in args.export) and importlib.util.find_spec('pyarrow') is None:
+        parser.error("The parquet and feather formats of '--export' need the pyarrow module.")
+    
+    if args.profile:
+        startProfiling(args.cProfile)
+    
+    global catalogTtl, fetchEngine, chartProcesses
+    catalogTtl = args.catalogTtl
+    chartProcesses = args.chartProcesses
+    rateLimit = args.rateLimit or (backfillRateLimit if args.backfill or args.update else 0)
+    fetchEngine = FetchEngine(baseUrl=args.apiUrl, workers=args.workers, timeout=args.timeout, retries=args.retries, rateLimit=rateLimit)
     
     if args.listOfCurrencies:
         printListOfAvailableNames()
     
-    if args.argument.find('_'):
-        args.argument = args.argument.split('_')
-        args.argument = ' '.join(args.argument)
+    # The deadline of the report starts before the arguments are checked, so the download of the catalog is limited by it too.
+    args.budget = LatencyBudget(args.deadline)
+    with profileStage('arguments'):
+        args.argument = prepareArgument(args.argument)
+        args.endDate = shiftUnpublishedDate(args.endDate)
+        args.beginDate = shiftUnpublishedDate(args.beginDate)
+        
+        if not isBatchMode(args) and not args.serve and not args.backfill and not args.update:
+            with args.budget:
+                checkArguments(args)
     
+    return args
+
+#This method parses the date entered by user.
+def parseDate(s):
+    return datetime.strptime(s +  " {:d}".format(datetime.now().hour), '%d-%m-%Y %H')
+
+#This method replaces '_' with spaces in the multi-word currency name.
+def prepareArgument(argument):
+    if argument.find('_'):
+        argument = argument.split('_')
+        argument = ' '.join(argument)
+    return argument
+
+#This method moves today's date to yesterday before 16:00, when the data of the current day isn't published yet.
+def shiftUnpublishedDate(date):
     currentDate = datetime.now()
-    
-    if args.endDate.year == currentDate.year and args.endDate.month == currentDate.month and args.endDate.day == currentDate.day and args.endDate.hour < 16:
-        args.endDate = args.endDate - timedelta(days=1)
-    
-    if args.beginDate.year == currentDate.year and args.beginDate.month == currentDate.month and args.beginDate.day == currentDate.day and args.beginDate.hour < 16:
-        args.beginDate = args.beginDate - timedelta(days=1)
-    
+    if date.year == currentDate.year and date.month == currentDate.month and date.day == currentDate.day and date.hour < 16:
+        date = date - timedelta(days=1)
+    return date
+
+#This method returns the last day whose fixings are already published: today after 16:00, otherwise yesterday.
+def getLastPublishedDay():
+    return shiftUnpublishedDate(datetime.now()).date()
+
+#This method checks the period and the argument of the report.
+def checkArguments(args):
     if not isValidDate(args.beginDate):
         raise ValueError('Wrong begin date of the period!')
     if not isValidDate(args.endDate):
         raise ValueError('Wrong end date of the period!')
     if not checkPeriod(args.beginDate, args.endDate):
         raise ValueError('Wrong relation between begin and end date!')
-    if not checkArgumentByCode(args.argument.upper()) and not checkArgumentByName(args.argument) and not args.argument == 'gold' and not args.argument == 'all':
+    if not args.argument in ('gold', 'all', 'matrix') and not checkArgumentByCode(args.argument.upper()) and not checkArgumentByName(args.argument):
         raise ValueError('Wrong argument!')
     else:
+        if args.argument == 'matrix':
+            for code in args.codes or []:
+                if getCatalog().tableByCode.get(code.upper()) != 'a':
+                    raise ValueError('Wrong currency code ' + code + '! The matrix compares only currencies of table A.')
         if args.argument == 'gold':
            if not checkGoldDataAvailability(args.beginDate):
                 raise ValueError("Couldn't get price of gold data!")
         else:
            if not checkCurrencyDataAvailability(args.beginDate):
                 raise ValueError("Couldn't get currency data!")
-    
-    return args
 
 # ================== End of parser ========================
 
+# ================== Profiling =========================
+
+#This class collects the stages of the script: their time and details like the downloaded bytes, and the counters, e.g. of requests and cache hits.
+#Stages are saved in the format of Chrome trace, which can be opened in chrome://tracing or Perfetto.
+class Profiler:
+
+    def __init__(self, isCProfile=False):
+        self.lock = threading.Lock()
+        self.start = time.perf_counter()
+        self.events = []
+        self.counters = {}
+        self.threadNames = {}
+        self.cProfile = None
+        if isCProfile:
+            import cProfile
+            self.cProfile = cProfile.Profile()
+            self.cProfile.enable()
+
+    #This method records the stage, which took the time from begin to end (values of time.perf_counter).
+    #The clock of time.perf_counter is shared by the processes, so the stages of other processes are recorded with the same times.
+    def addEvent(self, name, begin, end, details, pid=None, tid=None, threadName=None):
+        if tid is None:
+            tid = threading.get_ident()
+            threadName = threading.current_thread().name
+        event = {'name': name, 'ph': 'X', 'ts': begin * 1e6, 'dur': (end - begin) * 1e6, 'pid': pid or os.getpid(), 'tid': tid, 'args': details}
+        with self.lock:
+            self.events.append(event)
+            if threadName is not None:
+                self.threadNames[(event['pid'], tid)] = threadName
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    #This method returns the collected stages and counters and forgets them. It's used to send them from other processes.
+    def takeRecords(self):
+        with self.lock:
+            records = (self.events, self.counters, self.threadNames)
+            self.events = []
+            self.counters = {}
+            self.threadNames = {}
+        return records
+
+    #This method adds the stages and counters of another process.
+    def addRecords(self, records):
+        events, counters, threadNames = records
+        with self.lock:
+            self.events.extend(events)
+            self.threadNames.update(threadNames)
+        for name, value in counters.items():
+            self.count(name, value)
+
+    #This method returns the number, the total and the longest time in milliseconds of every stage.
+    def prepareSummary(self):
+        stages = {}
+        for event in self.events:
+            stage = stages.setdefault(event['name'], {'count': 0, 'totalMs': 0.0, 'maxMs': 0.0})
+            stage['count'] = stage['count'] + 1
+            stage['totalMs'] = stage['totalMs'] + event['dur'] / 1000
+            stage['maxMs'] = max(stage['maxMs'], event['dur'] / 1000)
+        return {'wallMs': (time.perf_counter() - self.start) * 1000, 'stages': stages, 'counters': self.counters}
+
+    #This method saves the summary, the trace and the cProfile statistics in the directory.
+    def save(self, directory):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        if self.cProfile is not None:
+            self.cProfile.disable()
+            self.cProfile.dump_stats(str(directory.joinpath('cprofile.prof')))
+        with open(directory.joinpath('summary.json'), 'w') as f:
+            json.dump(self.prepareSummary(), f, indent=4)
+        threadEvents = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}} for (pid, tid), name in self.threadNames.items()]
+        with open(directory.joinpath('trace.json'), 'w') as f:
+            events = [dict(event, ts=event['ts'] - self.start * 1e6) for event in self.events]
+            json.dump({'traceEvents': threadEvents + events, 'displayTimeUnit': 'ms'}, f)
+        print(f'Profile saved to: {directory.resolve().as_posix()}\n')
+
+#This class measures one stage of the profiler. Details of the stage can be added as items.
+class ProfileStage:
+    __slots__ = ('profiler', 'name', 'details', 'begin')
+
+    def __init__(self, profiler, name, details):
+        self.profiler = profiler
+        self.name = name
+        self.details = details
+        self.begin = 0.0
+
+    def __enter__(self):
+        self.begin = time.perf_counter()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.profiler.addEvent(self.name, self.begin, time.perf_counter(), self.details)
+        return False
+
+    def __setitem__(self, key, value):
+        self.details[key] = value
+
+#This class is used instead of ProfileStage when the profiler is disabled, so the stages cost almost nothing.
+class NoProfileStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        return False
+
+    def __setitem__(self, key, value):
+        pass
+
+noProfileStage = NoProfileStage()
+profiler = None
+
+#This method starts the profiler of the process.
+def startProfiling(isCProfile=False):
+    global profiler
+    profiler = Profiler(isCProfile)
+
+#This method returns the measured stage. Use it with the 'with' statement.
+def profileStage(name, **details):
+    if profiler is None:
+        return noProfileStage
+    return ProfileStage(profiler, name, details)
+
+#This method adds the value to the counter of the profiler.
+def countMetric(name, value=1):
+    if profiler is not None:
+        profiler.count(name, value)
+
+# ================== End of profiling =========================
+
 # ================== Dates handling =========================
 
+# The data source returns at most 367 days of currency rates or prices of gold and at most 93 days of tables in one response.
+maxWindowDays = 367
+maxTableWindowDays = 93
+
+# The first days with the data of currencies and of gold.
+firstCurrencyDay = date(2002, 1, 2)
+firstGoldDay = date(2013, 1, 2)
+
 #This method check if the entered date is before today.
 def isValidDate(date):
     if date.year > datetime.now().year:
@@ -123,382 +346,2039 @@ def checkCurrencyDataAvailability(beginDate):
         else:
             return True
 
-#This method returns the last day of each month.
-def getEndOfTheMonth(date):
-    if date.month == 12:
-        tempDate = date
-        return tempDate.replace(day=31)
-    else:
-        tempDate = date
-        return tempDate.replace(month=tempDate.month+1, day=1) - timedelta(days=1)
-
-#This method calculates number of months in the given period.
-def calculateNumberOfMonths(begin, end):
-    diffOfYears = 0
-    numOfMonths = 0
-    if end.year != begin.year and end.year - begin.year >= 2:
-        diffOfYears = end.year - (begin.year + 1)
-        numOfMonths = diffOfYears * 12 + (12 - begin.month) + 1 + end.month
-    elif end.year == begin.year and end.month != begin.month:
-        numOfMonths = end.month - begin.month + 1
-    elif end.year == begin.year and end.month == begin.month:
-        numOfMonths = 0
-    else:
-        numOfMonths = 12 + end.month - begin.month + 1
-    return numOfMonths
+#This method covers the given periods with the smallest number of periods accepted by the data source. Small gaps between the periods are downloaded again, because one longer request is cheaper than two short ones.
+def planFetchWindows(ranges, windowDays=maxWindowDays):
+    maxSpan = timedelta(days=windowDays-1)
+    windows = []
+    for begin, end in mergeRanges(ranges):
+        if len(windows) > 0 and begin <= windows[-1][0] + maxSpan:
+            windowBegin = windows[-1][0]
+            windows[-1] = (windowBegin, min(end, windowBegin + maxSpan))
+            begin = windows[-1][1] + timedelta(days=1)
+        while begin <= end:
+            windows.append((begin, min(end, begin + maxSpan)))
+            begin = windows[-1][1] + timedelta(days=1)
+    return windows
 
 # ===================== End of dates handling ======================
 
+# ===================== Currency catalog ==================
+
+catalogFile = Path('setup').joinpath('catalog.json')
+catalogTtl = 0
+catalog = None
+
+#This class holds the current tables A and B with indexes by currency name and code.
+#The timestamp is the time of the download, publishedDay is the last day whose table was published at this time.
+class CurrencyCatalog:
+
+    def __init__(self, tables, timestamp=None):
+        self.tables = tables
+        self.timestamp = timestamp or datetime.now().timestamp()
+        self.publishedDay = shiftUnpublishedDate(datetime.fromtimestamp(self.timestamp)).date()
+        self.names = []
+        self.codes = []
+        self.mids = []
+        self.codeByName = {}
+        self.nameByCode = {}
+        self.tableByCode = {}
+        self.midByCode = {}
+        for letter in ('a', 'b'):
+            for element in tables.get(letter, []):
+                self.names.append(element['currency'])
+                self.codes.append(element['code'])
+                self.mids.append(element['mid'])
+                self.codeByName.setdefault(element['currency'], element['code'])
+                self.nameByCode.setdefault(element['code'], element['currency'])
+                self.tableByCode.setdefault(element['code'], letter)
+                self.midByCode.setdefault(element['code'], element['mid'])
+
+#This method downloads the current tables A and B. The second value is False if any of them is missing.
+def downloadCatalogTables():
+    tables = {}
+    isComplete = True
+    letters = ['a', 'b']
+    futures = fetchEngine.submitCalls(fetchEngine.getJson, [('exchangerates/tables/' + letter.upper() + '/',) for letter in letters])
+    for letter, future in zip(letters, futures):
+        try:
+            lista = future.result()
+        except FetchError as e:
+            print("Couldn't get table " + letter.upper() + "! " + str(e))
+            isComplete = False
+            continue
+        if lista is None:
+            print("Couldn't get data! It might be caused by the lack of data.")
+            isComplete = False
+        else:
+            tables[letter] = lista[0]['rates']
+    return (tables, isComplete)
+
+#This method reads the catalog saved on the disk, if it is younger than catalogTtl seconds and no table was published since it was saved.
+#A corrupted or incomplete file is treated like a missing one, so the catalog is downloaded again and the file is overwritten.
+def readCatalogFile():
+    if catalogTtl <= 0 or not catalogFile.exists():
+        return None
+    try:
+        with open(catalogFile) as f:
+            saved = json.load(f)
+        if sorted(saved['tables']) != ['a', 'b']:
+            return None
+        if isCatalogStale(CurrencyCatalog(saved['tables'], saved['timestamp'])):
+            return None
+    except (ValueError, KeyError, TypeError, AttributeError, OverflowError, OSError):
+        return None
+    return saved
+
+#This method returns True if the catalog is older than catalogTtl seconds (when it's set) or the next table was published after its download.
+def isCatalogStale(catalog):
+    if catalogTtl > 0 and datetime.now().timestamp() - catalog.timestamp > catalogTtl:
+        return True
+    return catalog.publishedDay < getLastPublishedDay()
+
+#This method forgets the catalog of the process, so the next getCatalog() loads it again.
+def resetCatalog():
+    global catalog
+    catalog = None
+
+#This method returns the catalog of currencies. It is downloaded only once per process.
+#If table A or B couldn't be downloaded, the catalog isn't kept and FetchError is raised, because the currency can't be checked without it.
+#With isPartialAllowed the downloaded table is returned instead and the report is marked as partial.
+def getCatalog(isPartialAllowed=False):
+    global catalog
+    if catalog is None:
+        with profileStage('catalog') as stage:
+            saved = readCatalogFile()
+            stage['fromFile'] = saved is not None
+            if saved is None:
+                tables, isComplete = downloadCatalogTables()
+                if not isComplete and isPartialAllowed and len(tables) > 0:
+                    markReportPartial()
+                    return CurrencyCatalog(tables)
+                if not isComplete:
+                    raise FetchError("Couldn't download the currency tables A and B, so the argument can't be checked! Try again later.")
+                if catalogTtl > 0:
+                    catalogFile.parent.mkdir(parents=True, exist_ok=True)
+                    with open(catalogFile, 'w') as f:
+                        json.dump({'timestamp': datetime.now().timestamp(), 'tables': tables}, f)
+                catalog = CurrencyCatalog(tables)
+            else:
+                countMetric('catalog.fileHits')
+                catalog = CurrencyCatalog(saved['tables'], saved['timestamp'])
+    return catalog
+
+# ===================== End of currency catalog ==================
+
 # ===================== Handling the currency argument ==================
 
-#This function return the type of the currency table, it could be 'A' or 'B'.
+#This function return the type of the currency table, it could be 'a' or 'b'.
 def checkTableType(currName):
-    qu = 'http://api.nbp.pl/api/exchangerates/tables/A/'
-    dat = rq.urlopen(qu)
-    lista = json.loads(dat.read())
-    sl = lista[0]
-    listOfCurr = sl['rates']
-    currencyList = []
-    codeList = []
-    for element in listOfCurr:
-        currencyList.append(element['currency'])
-        codeList.append(element['code'])
-    letter = 'b'
-    for element in currencyList:
-        if currName == element:
-            letter = 'a'
-    for element in codeList:
-        if currName == element:
-            letter = 'a'
-    return letter
+    catalog = getCatalog()
+    code = catalog.codeByName.get(currName, currName)
+    return catalog.tableByCode.get(code, 'b')
 
 #This method check if the entered currency exisits in data source.    
 def checkArgumentByName(argument): 
-    currencyNamesList = prepareSpecialListOfCurriencies('currency')
-    for element in currencyNamesList:
-        if argument == element:
-            return True
-    return False
+    return argument in getCatalog().codeByName
 
 #This method check if the entered currency exists in data source.    
 def checkArgumentByCode(argument):
-    currencyCodesList = prepareSpecialListOfCurriencies('code')
-    for element in currencyCodesList:
-        if argument == element:
-            return True
-    return False    
+    return argument in getCatalog().nameByCode
 
 #This method returns the currency code of the given currency name.
 def getCurrencyCode(currName):
-    currencyNamesList = prepareSpecialListOfCurriencies('currency')
-    currencyCodesList = prepareSpecialListOfCurriencies('code')
-    idx = 0;
-    for element in currencyNamesList:
-        if element == currName:
-            break
-        idx = idx + 1
-    
-    code = currencyCodesList[idx]
-    return code
+    return getCatalog().codeByName[currName]
 
 #This method returns the currency name of the given currency code.
 def getCurrencyName(currCode):
-    currCode = currCode.upper()
-    currencyNamesList = prepareSpecialListOfCurriencies('currency')
-    currencyCodesList = prepareSpecialListOfCurriencies('code')
-    idx = 0;
-    for element in currencyCodesList:
-        if element == currCode:
-            break
-        idx = idx + 1
-    
-    name = currencyNamesList[idx]
-    return name
+    return getCatalog().nameByCode[currCode.upper()]
     
 #This method prints a list of available currencies (only names).
 def printListOfAvailableNames():
     print('Available currencies: ')
-    listCurr = prepareSpecialListOfCurriencies('currency')
-    for element in listCurr:
+    for element in getCatalog().names:
         print('* ' + element)
 
 # ======================= End of handling currency argument ==================
 
 # ======================= Handling the 'all' option ====================
 
-#This method prepare the list of currencies names or currencies codes.
-def prepareSpecialListOfCurriencies(type):
-    specialList = []
-    try:
-        qu = 'http://api.nbp.pl/api/exchangerates/tables/A/'
-        dat = rq.urlopen(qu)
-        lista = json.loads(dat.read())
-        sl = lista[0]
-        listOfCurr = sl['rates']
-        for element in listOfCurr:
-            specialList.append(element[type])
-    except HTTPError as e:
-        print("Couldn't get data! It might be caused by the lack of data.")
-    try:
-        qu = 'http://api.nbp.pl/api/exchangerates/tables/B/'
-        dat = rq.urlopen(qu)
-        lista = json.loads(dat.read())
-        sl = lista[0]
-        listOfCurr = sl['rates']
-        for element in listOfCurr:
-            specialList.append(element[type]) 
-    except HTTPError as e:
-        print("Couldn't get data! It might be caused by the lack of data.")
-        
-    return specialList
-
-#This method prepare the table of all currencies and write it on the disk in setup directory.
-def prepareTableOfAllCurrencies():
-    listOfNames = prepareSpecialListOfCurriencies('currency')
-    listOfCodes = prepareSpecialListOfCurriencies('code')
-    listOfRates = prepareSpecialListOfCurriencies('mid')
-         
-    data = {'Currency name':listOfNames, 'Currency code':listOfCodes, 'Rate':listOfRates}
-    currencyTable = pd.DataFrame(data)
-    name = 'setup\\currencyTable.csv'
-    currencyTable.to_csv(name,sep=';',index=False)
-    prepareTableJsonFile('currencyTable', 'thirdForm.html', '', '')
+#This method prepare the table of all currencies. It's written on the disk in setup directory only if user asked for side files.
+def prepareTableOfAllCurrencies(data, outDir=Path('.')):
+    catalog = getCatalog(isPartialAllowed=True)
+    manifest = BuildManifest(outDir, data.rebuild)
+    digest = hashInputs(catalog.tables, data.pageSize, data.sideFiles, data.export, isReportPartial(), getTemplateStamp(['thirdForm.html', 'table.html']))
+    if manifest.isUpToDate('currencyTable', digest, getTablePageFiles('currencyTable', len(catalog.codes), data.pageSize) + getExportFiles(data.export, ['currencyTable'])):
+        print('Report is up to date: ' + outDir.resolve().joinpath('forms', 'currencyTable.html').as_posix() + '\n')
+        return
+    
+    table = {'columns':['Currency name', 'Currency code', 'Rate'], 'data':[catalog.names, catalog.codes, catalog.mids]}
+    table['formats'] = [formatTextColumn, formatTextColumn, prepareFloatColumnFormat(catalog.mids)]
+    if data.sideFiles:
+        writeCsvSideFile(table, outDir.joinpath('setup', 'currencyTable.csv'))
+    if data.export:
+        import numpy as np
+        letters = [letter.upper() for letter in ('a', 'b') for element in catalog.tables.get(letter, [])]
+        columns = {'name': np.array(catalog.names, dtype=str), 'code': np.array(catalog.codes, dtype=str), 'table': np.array(letters, dtype=str), 'rate': np.array(catalog.mids, dtype=np.float64)}
+        exportDataset(outDir.joinpath('export'), 'currencyTable', data.export, columns)
+    prepareTablePages('currencyTable', 'thirdForm.html', '', '', outDir, table, data)
+    manifest.update('currencyTable', digest)
+    manifest.save()
 
 # ======================== End of handling the 'all' option =====================
+
+# ======================== Handling the 'matrix' option =====================
+
+#This method returns the rates of table A in the period as the 2-D array (days x currencies) with NaN on the days without the rate.
+#The days in the archive are read from it, the rest is downloaded by the table endpoint, which returns all currencies of one day in one answer.
+def loadRateMatrix(begin, end):
+    import numpy as np
+    parts = []
+    names = {}
+    downloadBegin = begin.date()
+    rateArchive = getArchive()
+    groupIndex = None if rateArchive is None else rateArchive.index['groups'].get('a')
+    if groupIndex is not None and date.fromisoformat(groupIndex['lastDay']) >= begin.date():
+        lastDay = min(date.fromisoformat(groupIndex['lastDay']), end.date())
+        archiveDays = rateArchive.getArray('a', 'days')
+        first = np.searchsorted(archiveDays, toDayNumber(begin), side='left')
+        last = np.searchsorted(archiveDays, toDayNumber(lastDay), side='right')
+        codes = [code for code, instrument in rateArchive.index['instruments'].items() if instrument['group'] == 'a']
+        parts.append((archiveDays[first:last], dict((code, rateArchive.getArray('a', code)[first:last]) for code in codes)))
+        names.update((code, rateArchive.index['instruments'][code]['name']) for code in codes)
+        downloadBegin = lastDay + timedelta(days=1)
+    if downloadBegin <= end.date():
+        columns, tableNames, lastDay = downloadBackfillGroup('a', downloadBegin, end.date())
+        tableDays = np.array(sorted(set(day for column in columns.values() for day in column)), dtype=np.int32)
+        parts.append((tableDays, dict((code, np.array([column.get(day, np.nan) for day in tableDays.tolist()])) for code, column in columns.items())))
+        names.update(tableNames)
+    
+    codes = list(names)
+    days = np.concatenate([part[0] for part in parts]) if len(parts) > 0 else np.empty(0, dtype=np.int32)
+    values = np.full((len(days), len(codes)), np.nan)
+    row = 0
+    for partDays, partColumns in parts:
+        for i, code in enumerate(codes):
+            if code in partColumns:
+                values[row:row+len(partDays), i] = partColumns[code]
+        row = row + len(partDays)
+    # Currencies without any rate in the period are skipped.
+    present = ~np.all(np.isnan(values), axis=0)
+    return (days, [code for code, isPresent in zip(codes, present) if isPresent], [names[code] for code, isPresent in zip(codes, present) if isPresent], values[:, present])
+
+#This method computes the statistics of every currency: the first and the last rate, the change in the period and the annual volatility of daily returns,
+#the correlation of daily returns of every pair of currencies and the cross rates of the last day. Everything is computed on the whole array at once.
+def computeMatrixStatistics(values):
+    import numpy as np
+    stats = {}
+    count = values.shape[1]
+    isPresent = ~np.isnan(values)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        stats['first'] = values[np.argmax(isPresent, axis=0), np.arange(count)] if len(values) > 0 else np.full(count, np.nan)
+        stats['last'] = values[len(values) - 1 - np.argmax(isPresent[::-1], axis=0), np.arange(count)] if len(values) > 0 else np.full(count, np.nan)
+        stats['change'] = (stats['last'] / stats['first'] - 1) * 100
+        stats['days'] = isPresent.sum(axis=0)
+        
+        returns = np.diff(np.log(values), axis=0)
+        returnsCount = (~np.isnan(returns)).sum(axis=0)
+        mean = np.nansum(returns, axis=0) / returnsCount
+        variance = np.nansum((returns - mean) ** 2, axis=0) / (returnsCount - 1)
+        stats['volatility'] = np.where(returnsCount > 1, np.sqrt(variance) * np.sqrt(252) * 100, np.nan)
+        
+        complete = returns[~np.isnan(returns).any(axis=1)]
+        if len(complete) > 1:
+            stats['correlation'] = np.atleast_2d(np.corrcoef(complete, rowvar=False))
+        else:
+            stats['correlation'] = np.full((count, count), np.nan)
+        
+        # One unit of the currency in the row costs the cross rate units of the currency in the column. Rates are in PLN, so PLN is added with the rate 1.
+        lastWithPln = np.append(stats['last'], 1.0)
+        stats['crossRates'] = lastWithPln[:, None] / lastWithPln[None, :]
+    return stats
+
+#This method returns the function formatting the numbers of the column with the given format. Missing values are shown as 'No data'.
+def prepareNumberColumnFormat(valueFormat):
+    def formatNumberColumn(chunk):
+        return ['No data' if value != value else valueFormat.format(value) for value in chunk]
+    return formatNumberColumn
+
+#This method prepares the table of the square matrix, e.g. of correlations. The first column contains the codes of the rows.
+def prepareMatrixTable(title, rowCodes, columnCodes, matrix, valueFormat):
+    table = {'title': title, 'columns': ['Currency code'] + columnCodes, 'data': [rowCodes] + [matrix[:, i] for i in range(len(columnCodes))]}
+    table['formats'] = [formatTextColumn] + [prepareNumberColumnFormat(valueFormat)] * len(columnCodes)
+    return table
+
+#This method prepares the report comparing currencies of table A in the period: currencyMatrix.html with the summary of every currency, the cross rates and the correlations.
+def prepareCurrencyMatrix(data, outDir=Path('.')):
+    import numpy as np
+    with profileStage('matrix.load'):
+        days, codes, names, values = loadRateMatrix(data.beginDate, data.endDate)
+    if data.codes:
+        selected = [codes.index(code.upper()) for code in data.codes if code.upper() in codes]
+        codes = [codes[i] for i in selected]
+        names = [names[i] for i in selected]
+        values = values[:, selected]
+    
+    manifest = BuildManifest(outDir, data.rebuild)
+    digest = hashInputs(days.tobytes(), values.tobytes(), codes, data.sideFiles, isReportPartial(), getTemplateStamp(['thirdForm.html', 'table.html']))
+    if manifest.isUpToDate('currencyMatrix', digest, ['forms/currencyMatrix.html']):
+        print('Report is up to date: ' + outDir.resolve().joinpath('forms', 'currencyMatrix.html').as_posix() + '\n')
+        return
+    if len(days) == 0:
+        print("Couldn't get data in the period! It might be caused by the lack of data.")
+    
+    with profileStage('matrix.analytics', days=len(days), currencies=len(codes)):
+        stats = computeMatrixStatistics(values)
+    table = {'columns':['Currency name', 'Currency code', 'First rate', 'Last rate', 'Change [%]', 'Volatility [%]', 'Days'], 'data':[names, codes, stats['first'], stats['last'], stats['change'], stats['volatility'], stats['days']]}
+    table['formats'] = [formatTextColumn, formatTextColumn, prepareNumberColumnFormat('{:.4f}'), prepareNumberColumnFormat('{:.4f}'), prepareNumberColumnFormat('{:.2f}'), prepareNumberColumnFormat('{:.2f}'), formatTextColumn]
+    if data.sideFiles:
+        writeCsvSideFile(table, outDir.joinpath('setup', 'currencyMatrix.csv'))
+    
+    period = np.datetime_as_string(days[[0, -1]].astype('datetime64[D]')) if len(days) > 0 else ['No data', 'No data']
+    lastDay = period[1]
+    sections = [prepareMatrixTable('Cross rates on ' + lastDay + ' (one unit of the currency in the row in the currency in the column)', codes + ['PLN'], codes + ['PLN'], stats['crossRates'], '{:.6g}'),
+                prepareMatrixTable('Correlation of daily returns', codes, codes, stats['correlation'], '{:.2f}')]
+    personalData = {'title': 'Currencies in the period ' + period[0] + ' - ' + period[1], 'columns': table['columns'], 'rows': generateTableRows(table, 0, len(codes)), 'partial': isReportPartial()}
+    personalData['sections'] = [{'title': section['title'], 'columns': section['columns'], 'rows': generateTableRows(section, 0, len(section['data'][0]))} for section in sections]
+    prepareReport('thirdForm.html', personalData, 'currencyMatrix', outDir)
+    manifest.update('currencyMatrix', digest)
+    manifest.save()
+
+# ======================== End of handling the 'matrix' option =====================
  
+# ======================== Downloading ===================== 
+
+# The address of the data source can be changed by the NBP_API_URL variable or the '--apiUrl' option, e.g. to use fakeNbpServer.py.
+apiUrl = os.environ.get('NBP_API_URL', 'http://api.nbp.pl/api/')
+
+#This exception is raised when the data source couldn't answer, even after retries. The lack of data (404) is not an error.
+class FetchError(Exception):
+    pass
+
+hedgePercentile = 95
+hedgeMinSamples = 10
+hedgeDefaultDelay = 1.0
+redirectStatuses = (301, 302, 303, 307, 308)
+maxRedirects = 5
+
+#This class is the latency budget of one report. It's set by the with statement and it's seen by all downloads of the report, also in the
+#threads of the pool. The remaining time limits the timeouts and the retries of the requests. Without the limit it only remembers
+#that some data couldn't be downloaded, so the report is marked as partial.
+class LatencyBudget:
+
+    def __init__(self, seconds=None):
+        self.end = time.monotonic() + seconds if seconds else None
+        self.isPartial = False
+        self.outstanding = 0
+        self.lock = threading.Lock()
+        self.token = None
+
+    def __enter__(self):
+        self.token = currentBudget.set(self)
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        currentBudget.reset(self.token)
+
+    #This method returns True if the budget has the time limit.
+    @property
+    def isLimited(self):
+        return self.end is not None
+
+    #This method returns the remaining time in seconds.
+    def getRemaining(self):
+        return float('inf') if self.end is None else self.end - time.monotonic()
+
+    #This method counts the requests of the report which are in progress.
+    def addOutstanding(self, value):
+        with self.lock:
+            self.outstanding = self.outstanding + value
+
+    #This method returns the timeout of the next request. The remaining time is split between the waves of the outstanding requests,
+    #which are sent by the given number of threads, so the last wave has its share of the budget too.
+    def getRequestTimeout(self, timeout, workers):
+        if self.end is None:
+            return timeout
+        with self.lock:
+            waves = max(1, -(-self.outstanding // workers))
+        return min(timeout, self.getRemaining() / waves)
+
+currentBudget = contextvars.ContextVar('currentBudget', default=None)
+
+#This method marks the report whose data is downloaded as partial, because a part of its data couldn't be downloaded.
+def markReportPartial():
+    budget = currentBudget.get()
+    if budget is not None:
+        budget.isPartial = True
+
+#This method returns True if the report whose data is downloaded is partial.
+def isReportPartial():
+    budget = currentBudget.get()
+    return budget is not None and budget.isPartial
+
+#This class downloads the data with a pool of threads. Every thread keeps its own persistent connection to the data source.
+class FetchEngine:
+
+    def __init__(self, baseUrl=apiUrl, workers=4, timeout=10.0, retries=3, backoff=0.5, rateLimit=0):
+        url = urlsplit(baseUrl)
+        self.origin = (url.scheme, url.hostname, url.port)
+        self.prefix = url.path.rstrip('/') + '/'
+        self.movedPrefix = None
+        self.workers = workers
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.local = threading.local()
+        self.poolLock = threading.Lock()
+        self.executor = None
+        self.minInterval = 1.0 / rateLimit if rateLimit > 0 else 0.0
+        self.rateLock = threading.Lock()
+        self.nextRequest = 0.0
+        self.hedgeExecutor = None
+        self.latencies = deque(maxlen=200)
+        self.latencyLock = threading.Lock()
+
+    #This method returns the pool of threads, which is created on the first use.
+    @property
+    def pool(self):
+        with self.poolLock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='fetch')
+            return self.executor
+
+    #This method returns the pool of threads which send the hedged requests. Every request and its copy are sent by these threads.
+    @property
+    def hedgePool(self):
+        with self.poolLock:
+            if self.hedgeExecutor is None:
+                self.hedgeExecutor = ThreadPoolExecutor(max_workers=2 * self.workers, thread_name_prefix='hedge')
+            return self.hedgeExecutor
+
+    #This method returns the connection of the current thread to the given origin (scheme, host, port).
+    #Usually it's only the data source, other origins are used after redirects.
+    def connection(self, origin):
+        conns = getattr(self.local, 'conns', None)
+        if conns is None:
+            conns = self.local.conns = {}
+        conn = conns.get(origin)
+        if conn is None:
+            scheme, host, port = origin
+            if scheme == 'https':
+                conn = http.client.HTTPSConnection(host, port, timeout=self.timeout)
+            else:
+                conn = http.client.HTTPConnection(host, port, timeout=self.timeout)
+            conns[origin] = conn
+        return conn
+
+    #This method closes the connection of the current thread to the given origin, the next request opens a new one.
+    def resetConnection(self, origin):
+        conns = getattr(self.local, 'conns', None)
+        if conns is not None and origin in conns:
+            conns.pop(origin).close()
+
+    #This method waits until the next request is allowed by the limit of requests per second. Requests of all threads are counted together.
+    def waitForTurn(self):
+        if self.minInterval <= 0:
+            return
+        with self.rateLock:
+            now = time.monotonic()
+            delay = self.nextRequest - now
+            self.nextRequest = max(now, self.nextRequest) + self.minInterval
+        if delay > 0:
+            time.sleep(delay)
+
+    #This method returns the decoded json answer for the given path or None if there is no data (404).
+    #Timeouts, connection errors, 429 and 5xx answers are retried with exponential backoff. Redirects are followed.
+    #With the latency budget of the report the timeouts and the retries end at its deadline and slow requests are hedged.
+    def getJson(self, path):
+        url = self.prefix + path
+        reason = ''
+        budget = currentBudget.get()
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                if budget is not None and budget.getRemaining() <= delay:
+                    reason = 'deadline'
+                    break
+                countMetric('fetch.retries')
+                time.sleep(delay)
+            delay = self.backoff * 2 ** attempt
+            timeout = self.timeout if budget is None else budget.getRequestTimeout(self.timeout, self.workers)
+            if timeout <= 0:
+                reason = 'deadline'
+                break
+            self.waitForTurn()
+            try:
+                if budget is not None and budget.isLimited:
+                    status, body, retryAfter = self.sendHedgedRequest(path, url, attempt, timeout)
+                else:
+                    status, body, retryAfter = self.sendRequest(path, url, attempt, timeout)
+            except (OSError, http.client.HTTPException) as e:
+                reason = type(e).__name__
+                continue
+            countMetric('fetch.requests')
+            countMetric('fetch.bytes', len(body))
+            if status == 200:
+                with profileStage('parse', path=path):
+                    return json.loads(body)
+            if status == 404:
+                return None
+            reason = 'HTTP ' + str(status)
+            if status != 429 and status < 500:
+                break
+            if retryAfter.isdigit():
+                delay = max(delay, min(float(retryAfter), 60.0))
+        if reason == 'deadline':
+            countMetric('fetch.deadlines')
+        raise FetchError('Request ' + url + ' failed (' + reason + ').')
+
+    #This method sends the request and follows the redirects of the answer (at most maxRedirects), all within the timeout.
+    #If the data source moved permanently (301, 308) and the new address keeps the path, the next requests go there directly.
+    #It returns the status, the body and the Retry-After header of the last answer.
+    def sendRequest(self, path, url, attempt, timeout):
+        origin, target = (self.origin, url) if self.movedPrefix is None else (self.movedPrefix[0], self.movedPrefix[1] + path)
+        deadline = time.monotonic() + timeout
+        for redirect in range(maxRedirects + 1):
+            status, body, retryAfter, location = self.sendSingleRequest(path, origin, target, attempt, max(deadline - time.monotonic(), 0.001))
+            if status not in redirectStatuses or location == '':
+                break
+            nextUrl = urlsplit(urljoin(origin[0] + '://' + origin[1] + ('' if origin[2] is None else ':' + str(origin[2])) + target, location))
+            if nextUrl.scheme not in ('http', 'https') or nextUrl.hostname is None:
+                break
+            countMetric('fetch.redirects')
+            origin = (nextUrl.scheme, nextUrl.hostname, nextUrl.port)
+            target = nextUrl.path + ('?' + nextUrl.query if nextUrl.query else '')
+            if status in (301, 308) and redirect == 0 and target.endswith('/' + path):
+                self.movedPrefix = (origin, target[:len(target) - len(path)])
+        return (status, body, retryAfter)
+
+    #This method sends one request with the connection of the current thread. It returns the status, the body, the Retry-After
+    #and the Location headers of the answer.
+    def sendSingleRequest(self, path, origin, url, attempt, timeout):
+        begin = time.monotonic()
+        try:
+            with profileStage('fetch', path=path, attempt=attempt) as stage:
+                conn = self.connection(origin)
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                conn.request('GET', url, headers={'Accept': 'application/json'})
+                response = conn.getresponse()
+                body = response.read()
+                stage['status'] = response.status
+                stage['bytes'] = len(body)
+        except (OSError, http.client.HTTPException):
+            self.resetConnection(origin)
+            raise
+        with self.latencyLock:
+            self.latencies.append(time.monotonic() - begin)
+        return (response.status, body, response.getheader('Retry-After', ''), response.getheader('Location', ''))
+
+    #This method sends the request and, if there is no answer after the hedge delay, sends its copy by another connection.
+    #The first answer is used. If it's an error, the other answer is awaited. Requests whose timeout is shorter than the delay aren't hedged.
+    def sendHedgedRequest(self, path, url, attempt, timeout):
+        hedgeDelay = self.getHedgeDelay()
+        if hedgeDelay >= timeout:
+            return self.sendRequest(path, url, attempt, timeout)
+        first = self.hedgePool.submit(contextvars.copy_context().run, self.sendRequest, path, url, attempt, timeout)
+        done, waiting = wait([first], timeout=hedgeDelay)
+        if len(done) > 0:
+            return first.result()
+        countMetric('fetch.hedges')
+        self.waitForTurn()
+        # The copy ends together with the first request, so the hedge doesn't extend the time limit of the request.
+        second = self.hedgePool.submit(contextvars.copy_context().run, self.sendRequest, path, url, attempt, timeout - hedgeDelay)
+        done, waiting = wait([first, second], return_when=FIRST_COMPLETED)
+        winner = done.pop()
+        if winner.exception() is not None and len(waiting) > 0:
+            winner = waiting.pop()
+        if winner is second:
+            countMetric('fetch.hedgeWins')
+        return winner.result()
+
+    #This method returns the delay of the hedged request: the 95th percentile of the latency of the previous requests.
+    def getHedgeDelay(self):
+        with self.latencyLock:
+            latencies = sorted(self.latencies)
+        if len(latencies) < hedgeMinSamples:
+            return hedgeDefaultDelay
+        return latencies[min(len(latencies) - 1, len(latencies) * hedgePercentile // 100)]
+
+    #This method calls the function in the pool of threads for every tuple of arguments. The latency budget of the report is passed
+    #to the threads. All calls are counted as outstanding before the first one starts, so the remaining time is split between all of them.
+    def submitCalls(self, function, argumentsList):
+        budget = currentBudget.get()
+        if budget is not None:
+            budget.addOutstanding(len(argumentsList))
+        futures = []
+        for arguments in argumentsList:
+            future = self.pool.submit(contextvars.copy_context().run, function, *arguments)
+            if budget is not None:
+                future.add_done_callback(lambda future: budget.addOutstanding(-1))
+            futures.append(future)
+        return futures
+
+fetchEngine = FetchEngine()
+
+# ======================== End of downloading ===================== 
+
+# ======================== Rate series ===================== 
+
+#This method returns the number of days since 01-01-1970 of the given date.
+def toDayNumber(date):
+    return date.toordinal() - epochOrdinal
+
+epochOrdinal = date(1970, 1, 1).toordinal()
+
+#This class holds the dates and values of currency rates or prices of gold in two contiguous arrays.
+#Dates are kept as int32 numbers of days since 01-01-1970 and values as float64, so one point takes 12 bytes.
+#The dates are sorted, slices share the memory with the original series and its range index.
+class RateSeries:
+    __slots__ = ('days', 'values', 'rangeIndex')
+
+    def __init__(self, days=None, values=None, rangeIndex=None):
+        import numpy as np
+        self.days = np.empty(0, dtype=np.int32) if days is None else days
+        self.values = np.empty(0, dtype=np.float64) if values is None else values
+        self.rangeIndex = rangeIndex
+
+    #This method decodes the answer of the data source: the list of prices of gold or the table of currency rates.
+    @classmethod
+    def fromNbpJson(cls, payload):
+        import numpy as np
+        if isinstance(payload, list):
+            items = payload
+            dateKey = 'data'
+            valueKey = 'cena'
+        else:
+            items = payload['rates']
+            dateKey = 'effectiveDate'
+            valueKey = 'mid'
+        count = len(items)
+        days = np.fromiter((item[dateKey] for item in items), dtype='datetime64[D]', count=count).astype(np.int32)
+        values = np.fromiter((item[valueKey] for item in items), dtype=np.float64, count=count)
+        return cls(days, values)
+
+    #This method reads the series from (day number, value) rows, e.g. the cursor of the local store.
+    @classmethod
+    def fromRows(cls, rows):
+        import numpy as np
+        records = np.fromiter(rows, dtype=[('day', np.int32), ('value', np.float64)])
+        return cls(np.ascontiguousarray(records['day']), np.ascontiguousarray(records['value']))
+
+    def __len__(self):
+        return len(self.days)
+
+    def __getitem__(self, key):
+        return RateSeries(self.days[key], self.values[key], self.rangeIndex)
+
+    #This method returns the dates as datetime64 values.
+    @property
+    def dates(self):
+        return self.days.astype('datetime64[D]')
+
+    #This method returns the memory used by the arrays in bytes.
+    @property
+    def nbytes(self):
+        return self.days.nbytes + self.values.nbytes
+
+    #This method returns the part of the series between the given day numbers (both included) without copying the data.
+    def sliceDays(self, beginDay, endDay=None):
+        import numpy as np
+        begin = np.searchsorted(self.days, beginDay, side='left')
+        end = len(self.days) if endDay is None else np.searchsorted(self.days, endDay, side='right')
+        return self[begin:end]
+
+    #This method joins two series. The values of the other series are used for the repeated days.
+    #If the series don't overlap and the other one is empty, the data isn't copied.
+    def merge(self, other):
+        import numpy as np
+        if len(other) == 0:
+            return self
+        if len(self) == 0:
+            return other
+        if self.days[-1] < other.days[0]:
+            return RateSeries(np.concatenate((self.days, other.days)), np.concatenate((self.values, other.values)))
+        days = np.concatenate((other.days, self.days))
+        values = np.concatenate((other.values, self.values))
+        days, idx = np.unique(days, return_index=True)
+        return RateSeries(days, values[idx])
+
+    #This method returns the range index of the series. It's built on the first call, slices use the index of the original series.
+    def getRangeIndex(self):
+        if self.rangeIndex is None:
+            self.rangeIndex = RangeIndex(self)
+        return self.rangeIndex
+
+#This class answers the statistics of any period of the series without reading its values. It's built once per series:
+#   * prefix sums give the sum and the mean of the period,
+#   * sparse tables (minimum and maximum of every part of length 2^k) give the minimum and the maximum of the period,
+#   * the sums, counts, minimums and maximums of every month and year are precomputed.
+#A query finds the period by binary search, so it takes O(log n) time. New fixings are appended without rebuilding the index.
+#Appended arrays are assigned after the tables, so threads which read the index during the append see the old or the new days.
+class RangeIndex:
+    units = {'month': 'datetime64[M]', 'year': 'datetime64[Y]'}
+
+    def __init__(self, series):
+        import numpy as np
+        self.days = np.empty(0, dtype=np.int32)
+        self.values = np.empty(0, dtype=np.float64)
+        self.prefix = np.zeros(1)
+        self.mins = []
+        self.maxs = []
+        self.buckets = {unit: None for unit in self.units}
+        self.append(series)
+
+    #This method adds the fixings after the last day of the index. Days which are already in the index are skipped.
+    def append(self, series):
+        import numpy as np
+        if len(self.days) > 0:
+            series = series.sliceDays(int(self.days[-1]) + 1)
+        if len(series) == 0:
+            return
+        oldCount = len(self.days)
+        days = np.concatenate((self.days, series.days))
+        values = np.concatenate((self.values, series.values))
+        prefix = np.concatenate((self.prefix, np.cumsum(np.concatenate((self.prefix[-1:], series.values)))[1:]))
+        mins = self.extendSparseTable(self.mins, values, oldCount, np.minimum)
+        maxs = self.extendSparseTable(self.maxs, values, oldCount, np.maximum)
+        buckets = {unit: self.extendBuckets(unit, self.buckets[unit], days, values) for unit in self.units}
+        self.prefix, self.mins, self.maxs, self.buckets, self.values = prefix, mins, maxs, buckets, values
+        self.days = days
+
+    #This method returns the sparse table of the values. Level k keeps the minimum (or maximum) of values[i:i+2^k]; only entries after the old values are computed.
+    @staticmethod
+    def extendSparseTable(levels, values, oldCount, function):
+        import numpy as np
+        count = len(values)
+        levels = [values] + levels[1:]
+        k = 1
+        while (1 << k) <= count:
+            half = 1 << (k - 1)
+            length = count - (1 << k) + 1
+            if k < len(levels):
+                done = max(0, oldCount - (1 << k) + 1)
+                levels[k] = np.concatenate((levels[k][:done], function(levels[k - 1][done:length], levels[k - 1][done + half:length + half])))
+            else:
+                levels.append(function(levels[k - 1][:length], levels[k - 1][half:length + half]))
+            k = k + 1
+        return levels
+
+    #This method returns the aggregates of every month or year of the values. The last bucket of the old values is computed again, because new fixings may belong to it.
+    @staticmethod
+    def extendBuckets(unit, buckets, days, values):
+        import numpy as np
+        first = 0 if buckets is None else int(buckets['starts'][-1])
+        keep = 0 if buckets is None else len(buckets['starts']) - 1
+        keys = days[first:].astype('datetime64[D]').astype(RangeIndex.units[unit])
+        starts = np.concatenate(([0], np.flatnonzero(keys[1:] != keys[:-1]) + 1))
+        tail = {
+            'keys': keys[starts],
+            'starts': starts + first,
+            'counts': np.diff(np.append(starts, len(keys))),
+            'sums': np.add.reduceat(values[first:], starts),
+            'mins': np.minimum.reduceat(values[first:], starts),
+            'maxs': np.maximum.reduceat(values[first:], starts),
+        }
+        if buckets is None:
+            return tail
+        return {name: np.concatenate((buckets[name][:keep], tail[name])) for name in tail}
+
+    #This method returns the positions of the first value of the period and the value after it.
+    def getBounds(self, beginDay, endDay):
+        import numpy as np
+        days = self.days
+        return (int(np.searchsorted(days, beginDay, side='left')), int(np.searchsorted(days, endDay, side='right')))
+
+    #This method returns the minimum of values[begin:end], which mustn't be empty, from two overlapping entries of the sparse table.
+    def getMin(self, begin, end):
+        k = (end - begin).bit_length() - 1
+        level = self.mins[k]
+        return min(level[begin], level[end - (1 << k)])
+
+    #This method returns the maximum of values[begin:end], which mustn't be empty.
+    def getMax(self, begin, end):
+        k = (end - begin).bit_length() - 1
+        level = self.maxs[k]
+        return max(level[begin], level[end - (1 << k)])
+
+    #This method returns the number of values, the sum, the mean, the minimum, the maximum, the first and the last value between the given day numbers (both included).
+    def query(self, beginDay, endDay):
+        import numpy as np
+        begin, end = self.getBounds(beginDay, endDay)
+        result = {'count': end - begin, 'sum': self.prefix[end] - self.prefix[begin]}
+        if end > begin:
+            result['mean'] = result['sum'] / result['count']
+            result['min'] = self.getMin(begin, end)
+            result['max'] = self.getMax(begin, end)
+            result['first'] = self.values[begin]
+            result['last'] = self.values[end - 1]
+        else:
+            result['mean'] = np.nan
+        return result
+
+    #This method returns the aggregates of the months or years ('month' or 'year') between the given day numbers: the first date,
+    #the number of values, the sum, the mean, the minimum and the maximum of every bucket. Only the first and the last bucket may be
+    #cut by the period, their aggregates are computed from the prefix sums and the sparse tables.
+    def aggregate(self, unit, beginDay, endDay):
+        import numpy as np
+        buckets = self.buckets[unit]
+        begin, end = self.getBounds(beginDay, endDay)
+        if end <= begin:
+            return {'begins': np.empty(0, dtype='datetime64[D]'), 'counts': np.empty(0, dtype=np.int64), 'sums': np.empty(0), 'means': np.empty(0), 'mins': np.empty(0), 'maxs': np.empty(0)}
+        first = int(np.searchsorted(buckets['starts'], begin, side='right')) - 1
+        last = int(np.searchsorted(buckets['starts'], end, side='left'))
+        starts = buckets['starts'][first:last].copy()
+        ends = np.append(buckets['starts'][first + 1:last], end)
+        starts[0] = begin
+        result = {name: buckets[name][first:last].copy() for name in ('counts', 'sums', 'mins', 'maxs')}
+        for i in set((0, len(starts) - 1)):
+            bucketEnd = len(self.values) if first + i + 1 >= len(buckets['starts']) else int(buckets['starts'][first + i + 1])
+            if starts[i] != buckets['starts'][first + i] or ends[i] != bucketEnd:
+                result['counts'][i] = ends[i] - starts[i]
+                result['sums'][i] = self.prefix[ends[i]] - self.prefix[starts[i]]
+                result['mins'][i] = self.getMin(int(starts[i]), int(ends[i]))
+                result['maxs'][i] = self.getMax(int(starts[i]), int(ends[i]))
+        result['begins'] = self.days[starts].astype('datetime64[D]')
+        result['means'] = result['sums'] / result['counts']
+        return result
+
+    #This method returns the series of the index.
+    @property
+    def series(self):
+        return RateSeries(self.days, self.values, self)
+
+# ======================== End of rate series ===================== 
+
 # ======================== Data preparation for currency case ===================== 
  
-#This method prepares the report of currency rates or price of gold for each month. 
+#This method downloads currency rates or prices of gold in the given period. 
 def prepareMonthlyPartOfTheData(letter, code, begin, end):
     beginDate = begin.strftime("%Y-%m-%d")
     endDate = end.strftime("%Y-%m-%d")
-    tempList = []
-    tempDateList = []
     
     if code == 'gold':
         if end.year == begin.year and end.month == begin.month and end.day == begin.day:
-            qu = 'http://api.nbp.pl/api/cenyzlota/' + endDate
+            qu = 'cenyzlota/' + endDate
         else:
-            qu = 'http://api.nbp.pl/api/cenyzlota/' + beginDate + '/' + endDate
-        
-        #print(qu)
-        try:
-            dat = rq.urlopen(qu)
-            sl = json.loads(dat.read())
-            for element in sl:
-                tempDateList.append(element['data'])
-                tempList.append(element['cena'])
-        except HTTPError as e:
-            print("Couldn't get data in " + beginDate + " - " + endDate + "! It might be caused by the lack of data at this date.")
+            qu = 'cenyzlota/' + beginDate + '/' + endDate
     else:
         if end.year == begin.year and end.month == begin.month and end.day == begin.day:
-            qu = 'http://api.nbp.pl/api/exchangerates/rates/' + letter + '/' + code + '/' + endDate + '/'
+            qu = 'exchangerates/rates/' + letter + '/' + code + '/' + endDate + '/'
         else:
-            qu = 'http://api.nbp.pl/api/exchangerates/rates/' + letter + '/' + code + '/' + beginDate  + '/' + endDate + '/'
+            qu = 'exchangerates/rates/' + letter + '/' + code + '/' + beginDate  + '/' + endDate + '/'
     
-        #print(qu)
-        try:
-            dat = rq.urlopen(qu)
-            sl = json.loads(dat.read())
-            for element in sl['rates']:
-                tempDateList.append(element['effectiveDate'])
-                tempList.append(element['mid'])
-        except HTTPError as e:
-            print("Couldn't get data in " + beginDate + " - " + endDate + "! It might be caused by the lack of data at this date.")
-    return (tempDateList, tempList)
-
-#This method returns the arrays of dates and values in the period entered by user    
-def getImportantData(valuesList, datesList, beginDate): 
-    importantValues = []
-    importantDates = []
-    idx = 0
-    isNotFound = True
-    
-    delta = beginDate - datetime.strptime(datesList[len(datesList)-1], '%Y-%m-%d')
-    if delta.days <= 0:
-        while isNotFound: 
-            for i in range(0, len(datesList)):
-                tempDate = datetime.strptime(datesList[i], '%Y-%m-%d') 
-                if tempDate.year == beginDate.year and tempDate.month == beginDate.month and tempDate.day == beginDate.day:
-                    idx = i
-                    isNotFound = False
-            beginDate = beginDate + timedelta(days=1)
-    
-        for i in range(idx, len(datesList)):
-            importantValues.append(valuesList[i])
-            importantDates.append(datesList[i])
-    return (importantDates, importantValues)
-    
-#This method prepares the plots and table of currency rates or price of gold.
-def prepareDataForReport(data):
-    lista = []
-    tempBegin = data.beginDate
-    if data.argument != 'gold':
-        if len(data.argument) < 4:
-            name = getCurrencyName(data.argument)
-            code = data.argument.upper()
+    sl = fetchEngine.getJson(qu)
+    if sl is None:
+        print("Couldn't get data in " + beginDate + " - " + endDate + "! It might be caused by the lack of data at this date.")
+        return RateSeries()
+    with profileStage('decode', path=qu):
+        return RateSeries.fromNbpJson(sl)
+
+#This method returns the mean value and the first date of each calendar month in the given series. The means are read from the range index.
+def prepareMonthlyMeans(series):
+    import numpy as np
+    if len(series) == 0:
+        return (np.empty(0), series.dates)
+    months = series.getRangeIndex().aggregate('month', series.days[0], series.days[-1])
+    return (months['means'], months['begins'])
+
+#This method returns the part of the series in the period entered by user. The dates are sorted, so the beginning is found by binary search.
+def getImportantData(series, beginDate): 
+    return series.sliceDays(toDayNumber(beginDate))
+
+#This method calculates all statistics of the report from the series. The minimum, the maximum and the means are answered by the range index of the series.
+def computeStatistics(series, beginDate):
+    import numpy as np
+    stats = {}
+    index = series.getRangeIndex()
+    important = getImportantData(series, beginDate)
+    stats['importantDates'] = important.dates
+    stats['importantValues'] = important.values
+    stats['count'] = len(important)
+    if stats['count'] > 0:
+        period = index.query(important.days[0], important.days[-1])
+        for key in ('first', 'last', 'min', 'max', 'mean'):
+            stats[key] = period[key]
+        stats['firstDate'] = stats['importantDates'][0]
+        stats['lastDate'] = stats['importantDates'][-1]
+    stats['monthsMeans'], stats['monthsBegins'] = prepareMonthlyMeans(series)
+    lastFive = series[-5:]
+    stats['lastFiveDates'] = lastFive.dates
+    stats['lastFiveValues'] = lastFive.values
+    stats['totalMean'] = index.query(series.days[0], series.days[-1])['mean'] if len(series) > 0 else np.nan
+    return stats
+    
+#This method returns the name, the code and the table letter of the currency or gold.
+def resolveInstrument(argument):
+    if argument != 'gold':
+        if len(argument) < 4:
+            name = getCurrencyName(argument)
+            code = argument.upper()
         else:
-            name = data.argument
+            name = argument
             code = getCurrencyCode(name)
         letter = checkTableType(name)
     else:
         letter = ''
-        code = data.argument
-        name = data.argument
-     
-    dateDiff = data.endDate - data.beginDate
+        code = argument
+        name = argument
+    return (name, code, letter)
+
+#This method returns the first day of the downloaded data. It's earlier than the begin of the period, because the figure of the last months needs at least 155 days.
+def getFetchBegin(beginDate, endDate):
+    dateDiff = endDate - beginDate
     if dateDiff.days <= 155:
-        tempBegin = data.endDate - timedelta(days=155)
+        tempBegin = endDate - timedelta(days=155)
     else:
         tempVal = dateDiff.days
         while tempVal % 5 != 0:
             tempVal = tempVal + 1
-        tempBegin = data.endDate - timedelta(days=tempVal)    
-    
-    numberOfMonths = calculateNumberOfMonths(tempBegin, data.endDate)
-    for i in range(numberOfMonths-1):
-        tempEnd = getEndOfTheMonth(tempBegin)
-        lista.append(prepareMonthlyPartOfTheData(letter, code, tempBegin, tempEnd))
-        tempBegin = tempEnd + timedelta(days=1)
-                
-    lista.append(prepareMonthlyPartOfTheData(letter, code, tempBegin, data.endDate))
-        
-    datesList = []
-    valuesList = []
-    monthsMeans = []
-    monthsNames = []
-    importantValuesList = []
-    for element in lista:
-        if len(element[0]) > 0:
-            for arg in element[0]:
-                datesList.append(arg)
-            for arg in element[1]:
-                valuesList.append(arg)
-            monthsMeans.append(np.mean(element[1]))
-            monthsNames.append(element[0][0])
-    
-    lastFiveValues = []
-    lastFiveDates = []
-    for i in range(len(valuesList)-5, len(valuesList)):
-        lastFiveValues.append(valuesList[i])
-        lastFiveDates.append(datesList[i])
-
-    for i in range(0, len(monthsNames)):
-        monthsNames[i] = datetime.strptime(monthsNames[i], '%Y-%m-%d').strftime("%B %Y")
-    
-    importantData = getImportantData(valuesList, datesList, data.beginDate)
-    if len(importantData[1]) > 0:
-        if importantData[1][0] > 0.009:
-            beginVal = "{:10.2f}".format(importantData[1][0])
-            endVal = "{:10.2f}".format(importantData[1][len(importantData[1])-1])
-            average = "{:10.2f}".format(sum(importantData[1])/len(importantData[1]))
-            beginDate = importantData[0][0]
-            endDate = importantData[0][len(importantData[1])-1]
-            minVal = "{:10.2f}".format(min(importantData[1]))
-            maxVal = "{:10.2f}".format(max(importantData[1]))
-        else:
-            beginVal = "{:10.3f}".format(importantData[1][0])
-            endVal = "{:10.3f}".format(importantData[1][len(importantData[1])-1])
-            average = "{:10.3f}".format(sum(importantData[1])/len(importantData[1]))
-            beginDate = importantData[0][0]
-            endDate = importantData[0][len(importantData[1])-1]
-            minVal = "{:10.3f}".format(min(importantData[1]))
-            maxVal = "{:10.3f}".format(max(importantData[1]))
+        tempBegin = endDate - timedelta(days=tempVal)    
+    return tempBegin
+
+#This method generates the report of the argument: the table of all currencies, the matrix of currencies or the report of the currency or gold.
+def generateReport(data, outDir=Path('.'), sync=True, loadSeries=None):
+    if data.argument == 'all':
+        prepareTableOfAllCurrencies(data, outDir)
+    elif data.argument == 'matrix':
+        prepareCurrencyMatrix(data, outDir)
+    elif data.stream:
+        prepareStreamedReport(data, outDir)
     else:
-        beginVal = 'No data'
-        endVal = 'No data'
-        average = 'No data'
-        beginDate = 'No data'
-        endDate = 'No data'
-        minVal = 'No data'
-        maxVal = 'No data'
-    
-    prepareWholePeriodFigure(importantData[1], importantData[0]) 
-    prepareLastFiveDaysFigures(lastFiveValues, lastFiveDates)
-    prepareLastMonthsFigures(monthsMeans, monthsNames, valuesList)
-    preparePriceTable(valuesList, datesList, data.beginDate)
-    prepareGeneralJsonFile(name, code, beginDate, endDate, beginVal, endVal, average, minVal, maxVal)
+        prepareDataForReport(data, outDir, sync, loadSeries)
+
+#This method prepares the plots and table of currency rates or price of gold. With sync=False it uses only the data from the local store.
+#The series is read by loadSeries, which has the arguments of loadRates.
+def prepareDataForReport(data, outDir=Path('.'), sync=True, loadSeries=None):
+    import numpy as np
+    if loadSeries is None:
+        loadSeries = loadArchivedRates
+    name, code, letter = resolveInstrument(data.argument)
+    tempBegin = getFetchBegin(data.beginDate, data.endDate)
+    
+    series = loadSeries(letter, code, tempBegin, data.endDate, sync)
+    manifest = BuildManifest(outDir, data.rebuild)
+    figuresDigest, tableDigest, reportDigest, exportDigest = prepareReportDigests(data, name, code, series)
+    isFiguresUpToDate, isTableUpToDate, isReportUpToDate, isExportUpToDate = checkReportParts(manifest, data, series, figuresDigest, tableDigest, reportDigest, exportDigest)
+    if isFiguresUpToDate and isTableUpToDate and isReportUpToDate and isExportUpToDate:
+        print('Report is up to date: ' + outDir.resolve().joinpath('forms', 'report.html').as_posix() + '\n')
+        return
+    
+    with profileStage('analytics', points=len(series)):
+        stats = computeStatistics(series, data.beginDate)
+    importantDates = np.datetime_as_string(stats['importantDates'])
+    lastFiveDates = np.datetime_as_string(stats['lastFiveDates'])
+    monthsNames = [month.item().strftime("%B %Y") for month in stats['monthsBegins']]
+    beginDate, endDate, beginVal, endVal, average, minVal, maxVal = prepareSummaryValues(stats)
+    
+    svgFigures = None
+    if data.charts == 'svg':
+        if not isReportUpToDate:
+            with profileStage('figures.svg'):
+                svgFigures = prepareSvgFigures(stats, importantDates, lastFiveDates, monthsNames, not data.noDecimation)
+    elif not isFiguresUpToDate:
+        figures = prepareWholePeriodFigure(stats['importantValues'], stats['importantDates'], not data.noDecimation)
+        figures += prepareLastFiveDaysFigures(stats['lastFiveValues'], lastFiveDates)
+        figures += prepareLastMonthsFigures(stats['monthsMeans'], monthsNames, stats['totalMean'], not data.noDecimation)
+        renderFigures(figures, outDir)
+        manifest.update('figures', figuresDigest)
+    if not isTableUpToDate:
+        priceTable = preparePriceTable(stats['importantValues'], importantDates, outDir, data.sideFiles)
+        prepareTablePages('priceTable', 'firstForm.html', name, code, outDir, priceTable, data)
+        manifest.update('priceTable', tableDigest)
+    if not isReportUpToDate:
+        prepareGeneralJsonFile(name, code, beginDate, endDate, beginVal, endVal, average, minVal, maxVal, outDir, svgFigures, data)
+        manifest.update('report', reportDigest)
+    if not isExportUpToDate:
+        important = getImportantData(series, data.beginDate)
+        months = important.getRangeIndex().aggregate('month', important.days[0], important.days[-1]) if len(important) > 0 else None
+        exportReportData(outDir.joinpath('export'), data, name, code, important, months, stats)
+        manifest.update('export', exportDigest)
+    manifest.save()
+
+#This method returns the digests of the inputs of the figures, the table, the report and the export of the currency or gold.
+def prepareReportDigests(data, name, code, series):
+    seriesDigest = hashInputs(name, code, data.beginDate.date(), data.endDate.date(), series.days.tobytes(), series.values.tobytes())
+    figuresDigest = hashInputs(seriesDigest, data.charts, data.noDecimation, getTemplateStamp([]))
+    tableDigest = hashInputs(seriesDigest, data.pageSize, data.sideFiles, isReportPartial(), getTemplateStamp(['firstForm.html', 'table.html']))
+    reportDigest = hashInputs(seriesDigest, data.charts, data.noDecimation, data.sideFiles, isReportPartial(), getTemplateStamp(['secondForm.html']))
+    exportDigest = hashInputs(seriesDigest, data.export, isReportPartial())
+    return (figuresDigest, tableDigest, reportDigest, exportDigest)
+
+#This method returns True for every part of the report (the figures, the table, the report and the export) which is up to date.
+#Every page of the table is checked, so a missing page is generated again.
+def checkReportParts(manifest, data, series, figuresDigest, tableDigest, reportDigest, exportDigest):
+    isFiguresUpToDate = data.charts == 'svg' or manifest.isUpToDate('figures', figuresDigest, ['img/' + fileName for fileName in figureFiles])
+    rowCount = len(getImportantData(series, data.beginDate))
+    isTableUpToDate = manifest.isUpToDate('priceTable', tableDigest, getTablePageFiles('priceTable', rowCount, data.pageSize))
+    isReportUpToDate = manifest.isUpToDate('report', reportDigest, ['forms/report.html'])
+    isExportUpToDate = not data.export or manifest.isUpToDate('export', exportDigest, getExportFiles(data.export, reportExportDatasets))
+    return (isFiguresUpToDate, isTableUpToDate, isReportUpToDate, isExportUpToDate)
+
+#This method returns the dates and the values of the description of the report: the first and the last date and value, the mean, the minimum and the maximum.
+def prepareSummaryValues(stats):
+    import numpy as np
+    if stats['count'] == 0:
+        return ('No data',)*7
+    if stats['first'] > 0.009:
+        valueFormat = "{:10.2f}"
+    else:
+        valueFormat = "{:10.3f}"
+    beginDate = np.datetime_as_string(stats['firstDate'])
+    endDate = np.datetime_as_string(stats['lastDate'])
+    return (beginDate, endDate, valueFormat.format(stats['first']), valueFormat.format(stats['last']), valueFormat.format(stats['mean']), valueFormat.format(stats['min']), valueFormat.format(stats['max']))
 
 # ===================== End of data preparation for currency case =========================
+
+# ===================== Local rate store =====================
+
+storeFile = Path('setup').joinpath('rates.db')
+
+#This method opens the local store of currency rates and prices of gold. Tables are created on the first use.
+def openRateStore():
+    storeFile.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(storeFile))
+    conn.execute('CREATE TABLE IF NOT EXISTS rates (code TEXT NOT NULL, effectiveDate TEXT NOT NULL, value REAL NOT NULL, PRIMARY KEY (code, effectiveDate))')
+    conn.execute('CREATE TABLE IF NOT EXISTS syncedRanges (code TEXT NOT NULL, beginDate TEXT NOT NULL, endDate TEXT NOT NULL)')
+    return conn
+
+#This method merges overlapping and adjacent periods.
+def mergeRanges(ranges):
+    merged = []
+    for begin, end in sorted(ranges):
+        if len(merged) > 0 and begin <= merged[-1][1] + timedelta(days=1):
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((begin, end))
+    return merged
+
+#This method returns the periods which were already downloaded for the given code.
+def getSyncedRanges(conn, code):
+    rows = conn.execute('SELECT beginDate, endDate FROM syncedRanges WHERE code = ?', (code,))
+    return mergeRanges([(date.fromisoformat(row[0]), date.fromisoformat(row[1])) for row in rows])
+
+#This method marks the period as downloaded. Historical fixings never change, so we don't have to ask for them again.
+def markSyncedRange(conn, code, begin, end):
+    ranges = getSyncedRanges(conn, code)
+    ranges.append((begin, end))
+    conn.execute('DELETE FROM syncedRanges WHERE code = ?', (code,))
+    conn.executemany('INSERT INTO syncedRanges VALUES (?, ?, ?)', [(code, r[0].isoformat(), r[1].isoformat()) for r in mergeRanges(ranges)])
+
+#This method returns the parts of the period which are not in the store yet.
+def findMissingRanges(conn, code, begin, end):
+    missing = []
+    for syncedBegin, syncedEnd in getSyncedRanges(conn, code):
+        if syncedEnd < begin:
+            continue
+        if syncedBegin > end:
+            break
+        if syncedBegin > begin:
+            missing.append((begin, syncedBegin - timedelta(days=1)))
+        begin = syncedEnd + timedelta(days=1)
+    if begin <= end:
+        missing.append((begin, end))
+    return missing
+
+#This method downloads the missing parts of the given periods to the store. Each request is a tuple (letter, code, begin, end).
+#Periods of the same code are merged first, so the days shared by many reports are downloaded only once.
+#It returns the codes whose data couldn't be downloaded, the report being generated is marked as partial.
+def syncRates(requests):
+    rangesByCode = {}
+    letters = {}
+    for letter, code, begin, end in requests:
+        rangesByCode.setdefault(code, []).append((begin.date(), end.date()))
+        letters[code] = letter
+    failedCodes = set()
+    conn = openRateStore()
+    try:
+        windows = []
+        for code, ranges in rangesByCode.items():
+            missing = []
+            for begin, end in mergeRanges(ranges):
+                missing.extend(findMissingRanges(conn, code, begin, end))
+            countMetric('store.hits' if len(missing) == 0 else 'store.misses')
+            windows.extend([(code, window[0], window[1]) for window in planFetchWindows(missing)])
+        countMetric('store.windows', len(windows))
+        futures = fetchEngine.submitCalls(prepareMonthlyPartOfTheData, [(letters[code], code, chunkBegin, chunkEnd) for code, chunkBegin, chunkEnd in windows])
+        for (code, chunkBegin, chunkEnd), future in zip(windows, futures):
+            try:
+                chunk = future.result()
+            except FetchError as e:
+                print("Couldn't get data in " + chunkBegin.isoformat() + " - " + chunkEnd.isoformat() + "! " + str(e) + " It will be downloaded again in the next run.")
+                failedCodes.add(code)
+                markReportPartial()
+                continue
+            saveDownloadedChunk(conn, code, chunk, chunkBegin, chunkEnd)
+    finally:
+        conn.close()
+    return failedCodes
+
+#This method saves the downloaded part of the series in the store and marks its period as downloaded.
+def saveDownloadedChunk(conn, code, chunk, chunkBegin, chunkEnd):
+    # Today's fixing may be published later, so the current day is marked as downloaded only after 16:00.
+    lastCompleteDay = getLastPublishedDay()
+    with conn, profileStage('store.write', code=code, rows=len(chunk)):
+        conn.executemany("INSERT OR REPLACE INTO rates VALUES (?, date(? * 86400, 'unixepoch'), ?)", zip([code]*len(chunk), chunk.days.tolist(), chunk.values.tolist()))
+        if chunkBegin <= lastCompleteDay:
+            markSyncedRange(conn, code, chunkBegin, min(chunkEnd, lastCompleteDay))
+
+#This method returns the series of the period from the store, the missing parts are downloaded first if sync is True.
+def loadRates(letter, code, begin, end, sync=True):
+    if sync:
+        with profileStage('store.sync', code=code):
+            syncRates([(letter, code, begin, end)])
+    conn = openRateStore()
+    try:
+        return readStoredRates(conn, code, begin, end)
+    finally:
+        conn.close()
+
+#This method reads the series of the period from the store.
+def readStoredRates(conn, code, begin, end):
+    with profileStage('store.load', code=code) as stage:
+        rows = conn.execute('SELECT CAST(julianday(effectiveDate) - 2440587.5 AS INTEGER), value FROM rates WHERE code = ? AND effectiveDate BETWEEN ? AND ? ORDER BY effectiveDate', (code, begin.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')))
+        series = RateSeries.fromRows(rows)
+        stage['rows'] = len(series)
+    return series
+
+# ===================== End of local rate store =====================
+
+# ===================== Rate archive =====================
+
+archiveDir = Path('setup').joinpath('archive')
+archive = None
+backfillRateLimit = 5
+
+#This class reads the archive of the whole history. Every group (table A, table B and gold) has its own axis of dates in 'days.npy'
+#and every currency has one file of values aligned to this axis, with NaN on the days without its rate. Files are memory-mapped,
+#so only the read part of the history is loaded and the series are slices of the files.
+class RateArchive:
+
+    def __init__(self, directory, index, stamp=None):
+        self.directory = directory
+        self.index = index
+        self.stamp = stamp
+        self.arrays = {}
+        self.lock = threading.Lock()
+
+    #This method returns the archive saved in the directory or None if there is no archive.
+    @classmethod
+    def open(cls, directory=archiveDir):
+        try:
+            with open(directory.joinpath('index.json')) as f:
+                return cls(directory, json.load(f), os.fstat(f.fileno()).st_mtime_ns)
+        except (OSError, ValueError):
+            return None
+
+    #This method returns the memory-mapped array of the file in the directory of the group.
+    def getArray(self, group, name):
+        import numpy as np
+        with self.lock:
+            key = (group, name)
+            if key not in self.arrays:
+                self.arrays[key] = np.load(self.directory.joinpath(group, name + '.npy'), mmap_mode='r')
+            return self.arrays[key]
+
+    #This method returns the group of the code or None if it isn't in the archive.
+    def getGroup(self, code):
+        instrument = self.index['instruments'].get(code)
+        return None if instrument is None else instrument['group']
+
+    #This method returns the last day of the archive of the code or None if it isn't in the archive.
+    def getLastDay(self, code):
+        group = self.getGroup(code)
+        if group is None:
+            return None
+        return date.fromisoformat(self.index['groups'][group]['lastDay'])
+
+    #This method returns the series of the code between the given day numbers. The series isn't copied, if the currency has the rate on every day of the period.
+    def getSeries(self, code, beginDay, endDay):
+        import numpy as np
+        group = self.getGroup(code)
+        days = self.getArray(group, 'days')
+        values = self.getArray(group, code)
+        begin = np.searchsorted(days, beginDay, side='left')
+        end = np.searchsorted(days, endDay, side='right')
+        days = days[begin:end]
+        values = values[begin:end]
+        present = ~np.isnan(values)
+        if not present.all():
+            days = days[present]
+            values = values[present]
+        return RateSeries(days, values)
+
+#This method returns the archive. It's opened once per process.
+def getArchive():
+    global archive
+    if archive is None:
+        archive = RateArchive.open()
+    return archive
+
+#This method opens the archive again, if its index was replaced since it was opened, e.g. by '--update' of another process.
+#Series taken from the old archive stay valid, because the files of the archive are replaced, not changed.
+def refreshArchive():
+    global archive
+    try:
+        stamp = os.stat(archiveDir.joinpath('index.json')).st_mtime_ns
+    except OSError:
+        stamp = None
+    if archive is None or archive.stamp != stamp:
+        archive = RateArchive.open()
+
+#This method returns the series of the period from the archive and the days after the end of the archive from the local store.
+#If the code isn't in the archive, the whole series is read from the local store.
+def loadArchivedRates(letter, code, begin, end, sync=True):
+    rateArchive = getArchive()
+    lastDay = None if rateArchive is None else rateArchive.getLastDay(code)
+    if lastDay is None or lastDay < begin.date():
+        return loadRates(letter, code, begin, end, sync)
+    with profileStage('archive.load', code=code):
+        series = rateArchive.getSeries(code, toDayNumber(begin), toDayNumber(min(end.date(), lastDay)))
+    countMetric('archive.hits')
+    if end.date() > lastDay:
+        tailBegin = lastDay + timedelta(days=1)
+        series = series.merge(loadRates(letter, code, datetime(tailBegin.year, tailBegin.month, tailBegin.day), end, sync))
+    return series
+
+#This method returns the first day of the period, which isn't in the archive. It's used to download only the days after the archive.
+def getArchiveTailBegin(code, begin):
+    rateArchive = getArchive()
+    lastDay = None if rateArchive is None else rateArchive.getLastDay(code)
+    if lastDay is None or lastDay < begin.date():
+        return begin
+    tailBegin = lastDay + timedelta(days=1)
+    return datetime(tailBegin.year, tailBegin.month, tailBegin.day)
+
+#This method returns the path of the request of the group in the period.
+def getBackfillPath(group, begin, end):
+    if group == 'gold':
+        return 'cenyzlota/' + begin.isoformat() + '/' + end.isoformat()
+    return 'exchangerates/tables/' + group.upper() + '/' + begin.isoformat() + '/' + end.isoformat() + '/'
+
+#This method downloads the rates of the group in the period. Tables are downloaded in periods of 93 days and prices of gold in periods of 367 days.
+#It returns the rates by code and day number, the names of currencies and the last downloaded day. Days after the first failed period are left for the next run.
+def downloadBackfillGroup(group, begin, end):
+    windowDays = maxWindowDays if group == 'gold' else maxTableWindowDays
+    windows = planFetchWindows([(begin, end)], windowDays) if begin <= end else []
+    futures = fetchEngine.submitCalls(fetchEngine.getJson, [(getBackfillPath(group, windowBegin, windowEnd),) for windowBegin, windowEnd in windows])
+    columns = {}
+    names = {}
+    lastDay = begin - timedelta(days=1)
+    for (windowBegin, windowEnd), future in zip(windows, futures):
+        try:
+            payload = future.result()
+        except FetchError as e:
+            print("Couldn't get data in " + windowBegin.isoformat() + " - " + windowEnd.isoformat() + "! " + str(e) + " It will be downloaded in the next run.")
+            markReportPartial()
+            for future in futures:
+                future.cancel()
+            break
+        for item in payload or []:
+            if group == 'gold':
+                columns.setdefault('gold', {})[toDayNumber(date.fromisoformat(item['data']))] = item['cena']
+                names['gold'] = 'gold'
+                continue
+            day = toDayNumber(date.fromisoformat(item['effectiveDate']))
+            for rate in item['rates']:
+                columns.setdefault(rate['code'], {})[day] = rate['mid']
+                names[rate['code']] = rate['currency']
+        lastDay = windowEnd
+    return (columns, names, lastDay)
+
+#This method saves the array in the directory of the archive. The file is replaced at once, so the reports never read a half-written file.
+def saveArchiveArray(directory, name, array):
+    import numpy as np
+    tempName = directory.joinpath(name + '.tmp.npy')
+    np.save(tempName, array)
+    os.replace(tempName, directory.joinpath(name + '.npy'))
+
+#This method downloads the whole history of all currencies and of gold to the archive. The next runs download only the days after the archive.
+#It returns the first downloaded day of every group which got new days.
+def runBackfill(args):
+    import numpy as np
+    lastCompleteDay = getLastPublishedDay()
+    firstNewDays = {}
+    rateArchive = RateArchive.open()
+    index = rateArchive.index if rateArchive is not None else {'groups': {}, 'instruments': {}}
+    for group, firstDay in (('a', firstCurrencyDay), ('b', firstCurrencyDay), ('gold', firstGoldDay)):
+        groupIndex = index['groups'].get(group)
+        begin = firstDay if groupIndex is None else date.fromisoformat(groupIndex['lastDay']) + timedelta(days=1)
+        with profileStage('backfill', group=group):
+            columns, names, lastDay = downloadBackfillGroup(group, begin, lastCompleteDay)
+        groupName = 'gold' if group == 'gold' else 'table ' + group.upper()
+        if begin > lastCompleteDay:
+            print('Archive of ' + groupName + ' is up to date.\n')
+            continue
+        if lastDay < begin:
+            print("Archive of " + groupName + " wasn't updated. It will be updated in the next run.\n")
+            continue
+        
+        # Old files are read into memory, not memory-mapped, because they are replaced below.
+        directory = archiveDir.joinpath(group)
+        directory.mkdir(parents=True, exist_ok=True)
+        oldDays = np.load(directory.joinpath('days.npy')) if groupIndex is not None else np.empty(0, dtype=np.int32)
+        newDays = np.array(sorted(set(day for column in columns.values() for day in column)), dtype=np.int32)
+        days = np.concatenate((oldDays, newDays))
+        codes = [code for code, instrument in index['instruments'].items() if instrument['group'] == group]
+        codes = codes + [code for code in names if code not in codes]
+        for code in codes:
+            values = np.full(len(days), np.nan)
+            if groupIndex is not None and code in index['instruments']:
+                values[:len(oldDays)] = np.load(directory.joinpath(code + '.npy'))
+            column = columns.get(code, {})
+            values[len(oldDays):] = [column.get(day, np.nan) for day in newDays.tolist()]
+            saveArchiveArray(directory, code, values)
+            name = names.get(code) or index['instruments'][code]['name']
+            index['instruments'][code] = {'group': group, 'name': name}
+        saveArchiveArray(directory, 'days', days)
+        firstNewDays[group] = begin
+        index['groups'][group] = {'firstDay': firstDay.isoformat(), 'lastDay': lastDay.isoformat(), 'days': len(days)}
+        print('Archive of ' + groupName + ' saved to: ' + directory.resolve().as_posix() + ' (' + str(len(days)) + ' days until ' + lastDay.isoformat() + ')\n')
+    
+    archiveDir.mkdir(parents=True, exist_ok=True)
+    tempName = archiveDir.joinpath('index.tmp')
+    with open(tempName, 'w') as f:
+        json.dump(index, f, indent=4)
+    os.replace(tempName, archiveDir.joinpath('index.json'))
+    return firstNewDays
+
+# ===================== End of rate archive =====================
  
+# ===================== Streaming =====================
+
+streamFigurePoints = 2000
+
+#This method yields the series of the period in parts of up to 367 days, in the order of dates. Parts are read from the archive or the local store,
+#the missing ones are downloaded and saved in the store. At most two parts per worker are waiting, so the next parts are downloaded while
+#the previous ones are processed and the memory doesn't depend on the length of the period.
+def streamRates(letter, code, begin, end):
+    rateArchive = getArchive()
+    lastDay = None if rateArchive is None else rateArchive.getLastDay(code)
+    conn = openRateStore()
+    try:
+        waiting = deque()
+        for chunkBegin, chunkEnd in planFetchWindows([(begin.date(), end.date())]):
+            if lastDay is not None and chunkEnd <= lastDay:
+                source = 'archive'
+            elif len(findMissingRanges(conn, code, chunkBegin, chunkEnd)) == 0:
+                source = 'store'
+            else:
+                source = fetchEngine.submitCalls(prepareMonthlyPartOfTheData, [(letter, code, chunkBegin, chunkEnd)])[0]
+            waiting.append((chunkBegin, chunkEnd, source))
+            if len(waiting) > 2 * fetchEngine.workers:
+                yield readStreamedChunk(conn, rateArchive, code, *waiting.popleft())
+        while len(waiting) > 0:
+            yield readStreamedChunk(conn, rateArchive, code, *waiting.popleft())
+    finally:
+        conn.close()
+
+#This method returns the part of the series from its source: the archive, the store or the download, which is saved in the store.
+def readStreamedChunk(conn, rateArchive, code, chunkBegin, chunkEnd, source):
+    countMetric('stream.chunks')
+    if source == 'archive':
+        return rateArchive.getSeries(code, toDayNumber(chunkBegin), toDayNumber(chunkEnd))
+    if source == 'store':
+        return readStoredRates(conn, code, chunkBegin, chunkEnd)
+    try:
+        chunk = source.result()
+    except FetchError as e:
+        print("Couldn't get data in " + chunkBegin.isoformat() + " - " + chunkEnd.isoformat() + "! " + str(e) + " It will be downloaded again in the next run.")
+        markReportPartial()
+        return RateSeries()
+    saveDownloadedChunk(conn, code, chunk, chunkBegin, chunkEnd)
+    return chunk
+
+#This class calculates the statistics of the report from the parts of the series, so the whole series is never kept in memory.
+#Only the monthly means grow with the period, by one number per month. The figure of the whole period keeps about maxPoints points:
+#the values are joined into groups of the same size and only the minimum and the maximum of every group are kept. When there are
+#too many groups, neighbouring groups are joined and the size of the next groups is doubled.
+class RunningStatistics:
+
+    def __init__(self, beginDay, maxPoints=streamFigurePoints):
+        import numpy as np
+        self.beginDay = beginDay
+        self.maxPoints = maxPoints
+        self.stats = {'count': 0, 'sum': 0.0}
+        self.totalCount = 0
+        self.totalSum = 0.0
+        self.months = []
+        self.lastFive = RateSeries()
+        self.groupSize = 1
+        self.groups = {'minDays': np.empty(0, dtype=np.int32), 'minValues': np.empty(0), 'maxDays': np.empty(0, dtype=np.int32), 'maxValues': np.empty(0)}
+        self.pending = RateSeries()
+
+    #This method adds the next part of the series and returns its part in the period entered by user.
+    def update(self, chunk):
+        import numpy as np
+        if len(chunk) == 0:
+            return chunk
+        self.totalCount = self.totalCount + len(chunk)
+        self.totalSum = self.totalSum + chunk.values.sum()
+        self.updateMonths(chunk)
+        self.lastFive = RateSeries(np.concatenate((self.lastFive.days, chunk.days[-5:]))[-5:], np.concatenate((self.lastFive.values, chunk.values[-5:]))[-5:])
+        important = chunk.sliceDays(self.beginDay)
+        if len(important) > 0:
+            stats = self.stats
+            if stats['count'] == 0:
+                stats['first'] = important.values[0]
+                stats['firstDate'] = important.dates[0]
+                stats['min'] = important.values[0]
+                stats['max'] = important.values[0]
+            stats['last'] = important.values[-1]
+            stats['lastDate'] = important.dates[-1]
+            stats['min'] = min(stats['min'], important.values.min())
+            stats['max'] = max(stats['max'], important.values.max())
+            stats['count'] = stats['count'] + len(important)
+            stats['sum'] = stats['sum'] + important.values.sum()
+            self.addFigurePoints(important)
+        return important
+
+    #This method adds the sums and the numbers of values of the months of the part. The first month may continue the last month of the previous part.
+    def updateMonths(self, chunk):
+        import numpy as np
+        months = chunk.dates.astype('datetime64[M]')
+        starts = np.concatenate(([0], np.flatnonzero(months[1:] != months[:-1]) + 1))
+        sums = np.add.reduceat(chunk.values, starts)
+        counts = np.diff(np.append(starts, len(chunk)))
+        for month, firstDay, monthSum, count in zip(months[starts], chunk.days[starts], sums, counts):
+            if len(self.months) > 0 and self.months[-1][0] == month:
+                self.months[-1][2] = self.months[-1][2] + monthSum
+                self.months[-1][3] = self.months[-1][3] + count
+            else:
+                self.months.append([month, firstDay, monthSum, count])
+
+    #This method joins the values into groups of groupSize values and keeps the minimum and the maximum of every group. The rest waits for the next part.
+    def addFigurePoints(self, series):
+        import numpy as np
+        pending = RateSeries(np.concatenate((self.pending.days, series.days)), np.concatenate((self.pending.values, series.values)))
+        full = len(pending) // self.groupSize * self.groupSize
+        if full > 0:
+            days = pending.days[:full].reshape(-1, self.groupSize)
+            values = pending.values[:full].reshape(-1, self.groupSize)
+            rows = np.arange(len(values))
+            minimum = values.argmin(axis=1)
+            maximum = values.argmax(axis=1)
+            self.appendGroups(days[rows, minimum], values[rows, minimum], days[rows, maximum], values[rows, maximum])
+        self.pending = pending[full:]
+        while 2 * len(self.groups['minDays']) > self.maxPoints:
+            self.joinGroups()
+
+    #This method adds the groups to the end of the figure.
+    def appendGroups(self, minDays, minValues, maxDays, maxValues):
+        import numpy as np
+        groups = self.groups
+        for name, array in (('minDays', minDays), ('minValues', minValues), ('maxDays', maxDays), ('maxValues', maxValues)):
+            groups[name] = np.concatenate((groups[name], array))
+
+    #This method joins every two neighbouring groups. If the number of groups is odd, the last group stays alone.
+    def joinGroups(self):
+        import numpy as np
+        groups = self.groups
+        full = len(groups['minDays']) // 2 * 2
+        rows = np.arange(full // 2)
+        minimum = groups['minValues'][:full].reshape(-1, 2).argmin(axis=1)
+        maximum = groups['maxValues'][:full].reshape(-1, 2).argmax(axis=1)
+        joined = {
+            'minDays': groups['minDays'][:full].reshape(-1, 2)[rows, minimum],
+            'minValues': groups['minValues'][:full].reshape(-1, 2)[rows, minimum],
+            'maxDays': groups['maxDays'][:full].reshape(-1, 2)[rows, maximum],
+            'maxValues': groups['maxValues'][:full].reshape(-1, 2)[rows, maximum],
+        }
+        self.groups = {name: np.concatenate((joined[name], groups[name][full:])) for name in groups}
+        self.groupSize = self.groupSize * 2
+
+    #This method returns the points of the figure of the whole period: the minimum and the maximum of every group in the order of dates, the waiting values and the first and the last value of the period.
+    def getFigurePoints(self):
+        import numpy as np
+        groups = self.groups
+        isMinFirst = groups['minDays'] <= groups['maxDays']
+        days = np.where(isMinFirst, groups['minDays'], groups['maxDays'])
+        values = np.where(isMinFirst, groups['minValues'], groups['maxValues'])
+        secondDays = np.where(isMinFirst, groups['maxDays'], groups['minDays'])
+        secondValues = np.where(isMinFirst, groups['maxValues'], groups['minValues'])
+        days = np.stack((days, secondDays), axis=1).ravel()
+        values = np.stack((values, secondValues), axis=1).ravel()
+        isNew = np.ones(len(days), dtype=bool)
+        isNew[1::2] = days[1::2] != days[0::2]
+        days = np.concatenate((days[isNew], self.pending.days))
+        values = np.concatenate((values[isNew], self.pending.values))
+        if self.stats['count'] > 0:
+            firstDay = toDayNumber(self.stats['firstDate'].item())
+            lastDay = toDayNumber(self.stats['lastDate'].item())
+            if days[0] != firstDay:
+                days = np.concatenate(([firstDay], days))
+                values = np.concatenate(([self.stats['first']], values))
+            if days[-1] != lastDay:
+                days = np.append(days, lastDay)
+                values = np.append(values, self.stats['last'])
+        return RateSeries(days.astype(np.int32), values)
+
+    #This method returns the statistics with the same keys as computeStatistics. The values of the period are the points of the figure.
+    def getStatistics(self):
+        import numpy as np
+        stats = dict(self.stats)
+        if stats['count'] > 0:
+            stats['mean'] = stats['sum'] / stats['count']
+        figure = self.getFigurePoints()
+        stats['importantDates'] = figure.dates
+        stats['importantValues'] = figure.values
+        stats['monthsMeans'] = np.array([month[2] / month[3] for month in self.months])
+        stats['monthsBegins'] = np.array([month[1] for month in self.months], dtype=np.int32).astype('datetime64[D]')
+        stats['lastFiveDates'] = self.lastFive.dates
+        stats['lastFiveValues'] = self.lastFive.values
+        stats['totalMean'] = self.totalSum / self.totalCount if self.totalCount > 0 else np.nan
+        return stats
+
+#This method yields the rows of the price table from the parts of the series. Every part is formatted with at least as many decimal places as the previous ones,
+#because the next parts aren't known yet. Rows are also written to the csv file, if it's given.
+def generateStreamedTableRows(chunks, csvFile=None):
+    decimals = 1
+    index = 0
+    for chunk in chunks:
+        decimals = max(decimals, getFloatDecimals(chunk.values))
+        valueFormat = '{:.' + str(decimals) + 'f}'
+        for day, value in zip(formatTextColumn(chunk.dates), chunk.values.tolist()):
+            cells = [day, valueFormat.format(value)]
+            if csvFile is not None:
+                csvFile.write(';'.join(cells) + '\n')
+            yield (index, cells)
+            index = index + 1
+
+#This class splits the streamed rows into pages. The next row is read in advance, so it's known if the page is the last one.
+class StreamedTable:
+
+    def __init__(self, rows, pageSize):
+        self.rows = iter(rows)
+        self.pageSize = pageSize
+        self.nextRow = None
+        self.isRead = False
+
+    #This method returns True if there are more rows.
+    def hasMore(self):
+        if not self.isRead:
+            self.nextRow = next(self.rows, None)
+            self.isRead = True
+        return self.nextRow is not None
+
+    #This method yields the rows of the next page. With pageSize = 0 all rows are on one page.
+    def readPage(self):
+        count = 0
+        while (self.pageSize == 0 or count < self.pageSize) and self.hasMore():
+            self.isRead = False
+            count = count + 1
+            yield self.nextRow
+
+#This class is the list of links to the pages of the streamed table. The template reads it after the rows of the page,
+#so it links the previous pages, the current page and the next page, if there are more rows.
+class StreamedPageLinks:
+
+    def __init__(self, table, page, pageNames):
+        self.table = table
+        self.page = page
+        self.pageNames = pageNames
+
+    def __bool__(self):
+        return self.page > 0 or self.table.hasMore()
+
+    def __iter__(self):
+        pageCount = self.page + (2 if self.table.hasMore() else 1)
+        for i in range(pageCount):
+            yield {'number': i+1, 'href': self.pageNames(i) + '.html', 'current': i == self.page}
+
+#This method writes the pages of the streamed table. Every page is written while its rows are read, so the table is never kept in memory.
+def prepareStreamedTable(fileName, formFileName, name, code, outDir, rows, data):
+    personalData = {'name': name, 'code': 'No data' if name == 'gold' else code, 'columns': ['Date', 'Price']}
+    pageNames = lambda page: fileName if page == 0 else fileName + '_' + str(page+1)
+    table = StreamedTable(rows, data.pageSize)
+    page = 0
+    while True:
+        pageData = dict(personalData)
+        pageData['rows'] = table.readPage()
+        if data.pageSize > 0:
+            pageData['pages'] = StreamedPageLinks(table, page, pageNames)
+        prepareReport(formFileName, pageData, pageNames(page), outDir)
+        page = page + 1
+        if data.pageSize == 0 or not table.hasMore():
+            break
+    removeExtraPages(fileName, page, outDir)
+
+#This method prepares the report of the currency or gold from the streamed series. The statistics are updated by every part of the series
+#while the table is written, then the figures and the report are prepared. The report is always generated again, because the digest
+#of the series isn't known before it's read. Its parts are removed from the build manifest before they are overwritten,
+#so the next run without '--stream' doesn't take them for the parts of its own report.
+def prepareStreamedReport(data, outDir=Path('.')):
+    import numpy as np
+    name, code, letter = resolveInstrument(data.argument)
+    manifest = BuildManifest(outDir, data.rebuild)
+    manifest.discard(['figures', 'priceTable', 'report', 'export'])
+    manifest.save()
+    tempBegin = getFetchBegin(data.beginDate, data.endDate)
+    running = RunningStatistics(toDayNumber(data.beginDate))
+    chunks = (running.update(chunk) for chunk in streamRates(letter, code, tempBegin, data.endDate))
+    csvFile = open(outDir.joinpath('setup', 'priceTable.csv'), 'w') if data.sideFiles else None
+    seriesWriter = ExportWriter(outDir.joinpath('export'), 'series', data.export, prepareSeriesColumns(RateSeries())) if data.export else None
+    monthParts = []
+    try:
+        if csvFile is not None:
+            csvFile.write('Date;Price\n')
+        if seriesWriter is not None:
+            chunks = exportStreamedChunks(chunks, seriesWriter, monthParts)
+        prepareStreamedTable('priceTable', 'firstForm.html', name, code, outDir, generateStreamedTableRows(chunks, csvFile), data)
+    finally:
+        if csvFile is not None:
+            csvFile.close()
+        if seriesWriter is not None:
+            seriesWriter.close()
+    
+    stats = running.getStatistics()
+    if data.export:
+        exportReportData(outDir.joinpath('export'), data, name, code, None, mergeMonthBuckets(monthParts), stats)
+    importantDates = np.datetime_as_string(stats['importantDates'])
+    lastFiveDates = np.datetime_as_string(stats['lastFiveDates'])
+    monthsNames = [month.item().strftime("%B %Y") for month in stats['monthsBegins']]
+    beginDate, endDate, beginVal, endVal, average, minVal, maxVal = prepareSummaryValues(stats)
+    svgFigures = None
+    if data.charts == 'svg':
+        with profileStage('figures.svg'):
+            svgFigures = prepareSvgFigures(stats, importantDates, lastFiveDates, monthsNames, not data.noDecimation)
+    else:
+        figures = prepareWholePeriodFigure(stats['importantValues'], stats['importantDates'], not data.noDecimation)
+        figures += prepareLastFiveDaysFigures(stats['lastFiveValues'], lastFiveDates)
+        figures += prepareLastMonthsFigures(stats['monthsMeans'], monthsNames, stats['totalMean'], not data.noDecimation)
+        renderFigures(figures, outDir)
+    prepareGeneralJsonFile(name, code, beginDate, endDate, beginVal, endVal, average, minVal, maxVal, outDir, svgFigures, data)
+
+# ===================== End of streaming =====================
+
+# ===================== Export =====================
+
+exportExtensions = {'parquet': '.parquet', 'feather': '.feather', 'ndjson': '.ndjson'}
+reportExportDatasets = ['series', 'months', 'statistics']
+
+#This method returns the paths of the exported datasets in the given formats, relative to the directory of the report.
+def getExportFiles(formats, datasets):
+    return ['export/' + dataset + exportExtensions[fileFormat] for dataset in datasets for fileFormat in formats or []]
+
+#This class writes one dataset in the given formats. The columns are numpy arrays: datetime64 columns are saved as dates, numbers as float64 or int64
+#and text as strings. Missing numbers (NaN) are saved as nulls. The first columns, even empty ones, set the types, so the file is written also when there are no rows.
+#Feather files are written without compression, so they can be read by memory mapping without copying.
+#The dataset can be written in parts, e.g. by the streamed report, so it's never kept in memory as a whole.
+class ExportWriter:
+
+    def __init__(self, directory, dataset, formats, columns):
+        directory.mkdir(parents=True, exist_ok=True)
+        self.writers = {}
+        for fileFormat in formats:
+            fileName = directory.joinpath(dataset + exportExtensions[fileFormat])
+            if fileFormat == 'ndjson':
+                self.writers[fileFormat] = open(fileName, 'w', encoding='utf-8')
+                continue
+            import pyarrow as pa
+            schema = prepareArrowTable(columns).schema
+            if fileFormat == 'parquet':
+                import pyarrow.parquet as pq
+                self.writers[fileFormat] = pq.ParquetWriter(fileName.as_posix(), schema)
+            else:
+                self.writers[fileFormat] = pa.ipc.new_file(fileName.as_posix(), schema)
+
+    #This method writes the next rows of the dataset.
+    def write(self, columns):
+        if len(next(iter(columns.values()))) == 0:
+            return
+        table = None
+        for fileFormat, writer in self.writers.items():
+            if fileFormat == 'ndjson':
+                writeNdjsonRows(writer, columns)
+            else:
+                if table is None:
+                    table = prepareArrowTable(columns)
+                writer.write_table(table)
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+
+#This method returns the Arrow table of the columns.
+def prepareArrowTable(columns):
+    import pyarrow as pa
+    arrays = {}
+    for name, column in columns.items():
+        if column.dtype.kind == 'M':
+            arrays[name] = pa.array(column.astype('datetime64[D]'), type=pa.date32())
+        elif column.dtype.kind in 'US':
+            arrays[name] = pa.array(column.tolist(), type=pa.string())
+        else:
+            arrays[name] = pa.array(column, from_pandas=True)
+    return pa.table(arrays)
+
+#This method writes the rows of the columns as json objects, one per line. Dates are written as 'yyyy-mm-dd', NaN and NaT as null.
+def writeNdjsonRows(f, columns):
+    import numpy as np
+    lists = []
+    for column in columns.values():
+        if column.dtype.kind == 'M':
+            lists.append([None if day == 'NaT' else day for day in np.datetime_as_string(column.astype('datetime64[D]')).tolist()])
+        elif column.dtype.kind == 'f':
+            lists.append([None if value != value else value for value in column.tolist()])
+        else:
+            lists.append(column.tolist())
+    names = list(columns)
+    f.writelines(json.dumps(dict(zip(names, row)), ensure_ascii=False) + '\n' for row in zip(*lists))
+
+#This method writes the whole dataset in the given formats.
+def exportDataset(directory, dataset, formats, columns):
+    writer = ExportWriter(directory, dataset, formats, columns)
+    try:
+        writer.write(columns)
+    finally:
+        writer.close()
+
+#This method returns the columns of the series: the date and the rate or the price of gold.
+def prepareSeriesColumns(series):
+    return {'date': series.dates.astype('datetime64[D]'), 'value': series.values.astype('float64')}
+
+#This method returns the columns of the monthly aggregates: the first day of the month, the number of values, the mean, the minimum and the maximum.
+def prepareMonthColumns(months):
+    import numpy as np
+    if months is None:
+        months = {'begins': np.empty(0, dtype='datetime64[D]'), 'counts': np.empty(0, dtype=np.int64), 'means': np.empty(0), 'mins': np.empty(0), 'maxs': np.empty(0)}
+    return {'month': months['begins'].astype('datetime64[M]').astype('datetime64[D]'), 'count': months['counts'].astype(np.int64), 'mean': months['means'], 'min': months['mins'], 'max': months['maxs']}
+
+#This method returns the monthly aggregates of the parts of the series, made by RangeIndex.extendBuckets. The month split between two parts is joined.
+def mergeMonthBuckets(parts):
+    import numpy as np
+    if len(parts) == 0:
+        return None
+    keys = np.concatenate([part['keys'] for part in parts])
+    starts = np.concatenate(([0], np.flatnonzero(keys[1:] != keys[:-1]) + 1))
+    counts = np.add.reduceat(np.concatenate([part['counts'] for part in parts]), starts)
+    sums = np.add.reduceat(np.concatenate([part['sums'] for part in parts]), starts)
+    return {'begins': keys[starts].astype('datetime64[D]'), 'counts': counts, 'means': sums / counts,
+            'mins': np.minimum.reduceat(np.concatenate([part['mins'] for part in parts]), starts),
+            'maxs': np.maximum.reduceat(np.concatenate([part['maxs'] for part in parts]), starts)}
+
+#This method writes the series in the period, the monthly aggregates and the statistics of the report. The streamed report writes the series by itself, so it's None.
+def exportReportData(directory, data, name, code, series, months, stats):
+    import numpy as np
+    if series is not None:
+        exportDataset(directory, 'series', data.export, prepareSeriesColumns(series))
+    exportDataset(directory, 'months', data.export, prepareMonthColumns(months))
+    statistics = {'name': np.array([name]), 'code': np.array([code]),
+                  'beginDate': np.array([data.beginDate.date()], dtype='datetime64[D]'), 'endDate': np.array([data.endDate.date()], dtype='datetime64[D]'),
+                  'firstDate': np.array([stats.get('firstDate', 'NaT')], dtype='datetime64[D]'), 'lastDate': np.array([stats.get('lastDate', 'NaT')], dtype='datetime64[D]'),
+                  'count': np.array([stats['count']], dtype=np.int64)}
+    for key in ('first', 'last', 'min', 'max', 'mean'):
+        statistics[key] = np.array([stats.get(key, np.nan)], dtype=np.float64)
+    statistics['partial'] = np.array([isReportPartial()])
+    exportDataset(directory, 'statistics', data.export, statistics)
+
+#This method writes the parts of the streamed series and collects their monthly aggregates, while they are passed to the table.
+def exportStreamedChunks(chunks, writer, monthParts):
+    for chunk in chunks:
+        if len(chunk) > 0:
+            writer.write(prepareSeriesColumns(chunk))
+            monthParts.append(RangeIndex.extendBuckets('month', None, chunk.days, chunk.values))
+        yield chunk
+
+# ===================== End of export =====================
+
 # ===================== Figures and table preparation ===================== 
 
-#This method create and save the figure of the whole entered period.
-def prepareWholePeriodFigure(importantValues, importantDates):
-    plt.figure(figsize=(6,5))
-    if len(importantDates) > 15:
-        plt.plot(importantDates, importantValues, color='gold', linestyle='-')
-        plt.xticks([0, len(importantDates)], [importantDates[0], importantDates[-1]])
+maxFigurePoints = 1000
+
+#This method returns the indexes of the points kept by the Largest-Triangle-Three-Buckets method. The first and the last point are always kept.
+#The other points are split into threshold-2 buckets and every bucket keeps the point which makes the largest triangle with the point kept
+#in the previous bucket and the mean point of the next bucket, so the peaks and the shape of the line are preserved.
+def selectLttbPoints(x, y, threshold):
+    import numpy as np
+    count = len(y)
+    if threshold >= count or threshold < 3:
+        return np.arange(count)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, count - 1, threshold - 1).astype(np.int64)
+    edges = np.append(edges, count)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = count - 1
+    previous = 0
+    for i in range(threshold - 2):
+        begin, end = edges[i], edges[i+1]
+        nextX = x[end:edges[i+2]].mean()
+        nextY = y[end:edges[i+2]].mean()
+        areas = np.abs((x[previous] - nextX) * (y[begin:end] - y[previous]) - (x[previous] - x[begin:end]) * (nextY - y[previous]))
+        previous = begin + int(np.argmax(areas))
+        selected[i+1] = previous
+    return selected
+
+#This method returns the indexes of the points drawn on the figure. If there are more than maxFigurePoints points, which is about twice
+#the width of the figure in pixels, they are reduced by LTTB, unless the decimation is turned off.
+def selectFigurePoints(x, values, isDecimated=True):
+    import numpy as np
+    if not isDecimated or len(values) <= maxFigurePoints:
+        return np.arange(len(values))
+    return selectLttbPoints(x, values, maxFigurePoints)
+
+#This method prepares the figure of the whole entered period. The dates are numbers of days, so the points of the long periods can be reduced.
+def prepareWholePeriodFigure(importantValues, importantDates, isDecimated=True):
+    import numpy as np
+    days = importantDates.astype('datetime64[D]').astype(np.int64)
+    points = selectFigurePoints(days, importantValues, isDecimated)
+    return [('wholePeriod.png', (6,5), drawWholePeriodFigure, (importantValues[points], days[points]))]
+
+#This method draws the figure of the whole entered period on the numeric axis of days. Only the dates are shown as labels.
+def drawWholePeriodFigure(ax, importantValues, days):
+    import numpy as np
+    labels = np.datetime_as_string(days.astype('datetime64[D]'))
+    if len(days) > 15:
+        ax.plot(days, importantValues, color='gold', linestyle='-')
+        ax.set_xticks([days[0], days[-1]], [labels[0], labels[-1]])
     else:
-        plt.plot(importantDates, importantValues, color='gold', marker='o', linestyle='-')
-        plt.xticks(importantDates, fontsize=6, rotation=45)
-    if len(importantDates) == 0:
-        plt.title('No data')
-    plt.savefig('img\\wholePeriod.png')
-    plt.clf()
-
-#This method creater and save the figure of the currency rates for last week. 
+        ax.plot(days, importantValues, color='gold', marker='o', linestyle='-')
+        ax.set_xticks(days, labels)
+        ax.tick_params(axis='x', labelsize=6, labelrotation=45)
+    if len(days) == 0:
+        ax.set_title('No data')
+
+#This method prepares the figures of the currency rates for last week. 
 def prepareLastFiveDaysFigures(lastFiveValues, lastFiveDates):
-    plt.figure(figsize=(6,5))
-    plt.plot(lastFiveDates, lastFiveValues, color='gold', marker='o', linestyle='-')
-    plt.xticks(lastFiveDates, fontsize=6, rotation=45)
-    plt.savefig('img\\lastFive.png')
-    plt.clf()
-    fig,ax = plt.subplots(figsize=(6,5))
+    return [('lastFive.png', (6,5), drawLastFiveDaysFigure, (lastFiveValues, lastFiveDates)),
+            ('lastFiveMean.png', (6,5), drawLastFiveDaysMeanFigure, (lastFiveValues, lastFiveDates))]
+
+#This method draws the figure of the currency rates for last week. 
+def drawLastFiveDaysFigure(ax, lastFiveValues, lastFiveDates):
+    ax.plot(lastFiveDates, lastFiveValues, color='gold', marker='o', linestyle='-')
+    ax.set_xticks(lastFiveDates)
+    ax.tick_params(axis='x', labelsize=6, labelrotation=45)
+
+#This method draws the figure of the currency rates for last week with the mean value line. 
+def drawLastFiveDaysMeanFigure(ax, lastFiveValues, lastFiveDates):
+    import numpy as np
     ax.plot(range(0, len(lastFiveDates)), lastFiveValues, color='gold', marker='o', linestyle='-')
     mean = [np.mean(lastFiveValues)]*len(lastFiveDates)
     ax.plot(lastFiveDates, mean, label='Mean = '+"{:10.3f}".format(np.mean(lastFiveValues))+' zl', color='red', linestyle='-')
-    plt.xticks(lastFiveDates, fontsize=6, rotation=45)
+    ax.set_xticks(lastFiveDates)
+    ax.tick_params(axis='x', labelsize=6, labelrotation=45)
     ax.legend(loc='upper right')
-    plt.savefig('img\\lastFiveMean.png')
-    plt.clf()
  
-#This method creates and save the figure of the mean value of the currency rates for each month. 
-def prepareLastMonthsFigures(monthsMeans, monthsNames, valuesList):
-    plt.figure(figsize=(6,7))
+#This method prepares the figures of the mean value of the currency rates for each month. 
+def prepareLastMonthsFigures(monthsMeans, monthsNames, totalMean, isDecimated=True):
+    import numpy as np
+    positions = selectFigurePoints(np.arange(len(monthsMeans)), monthsMeans, isDecimated)
+    monthsMeans = np.asarray(monthsMeans)[positions]
+    monthsNames = [monthsNames[i] for i in positions]
+    return [('lastMonths.png', (6,7), drawLastMonthsFigure, (monthsMeans, monthsNames, positions)),
+            ('lastMonthsMean.png', (6,7), drawLastMonthsMeanFigure, (monthsMeans, monthsNames, positions, totalMean))]
+
+#This method draws the figure of the mean value of the currency rates for each month. Months are placed at their positions in the period.
+def drawLastMonthsFigure(ax, monthsMeans, monthsNames, positions):
     if len(monthsNames) <= 12:
-        plt.plot(monthsNames, monthsMeans, color='gold', marker='o', linestyle='-')
+        ax.plot(positions, monthsMeans, color='gold', marker='o', linestyle='-')
     else:
-        plt.plot(monthsNames, monthsMeans, color='gold', linestyle='-')
-    plt.xticks(monthsNames, fontsize=6, rotation=60)
+        ax.plot(positions, monthsMeans, color='gold', linestyle='-')
+    ax.set_xticks(positions, monthsNames)
+    ax.tick_params(axis='x', labelsize=6, labelrotation=60)
     if len(monthsNames) > 12:    
-        plt.xticks([0, len(monthsNames)], [monthsNames[0], monthsNames[-1]])
-    plt.savefig('img\\lastMonths.png')
-    plt.clf()
-    
-    fig,ax = plt.subplots(figsize=(6,7))
+        ax.set_xticks([0, positions[-1] + 1], [monthsNames[0], monthsNames[-1]])
+
+#This method draws the figure of the mean value of the currency rates for each month with the mean value line. 
+def drawLastMonthsMeanFigure(ax, monthsMeans, monthsNames, positions, totalMean):
     if len(monthsNames) <= 12:
-        ax.plot(range(0, len(monthsMeans)), monthsMeans, color='gold', marker='o', linestyle='-')
+        ax.plot(positions, monthsMeans, color='gold', marker='o', linestyle='-')
     else:
-        ax.plot(range(0, len(monthsMeans)), monthsMeans, color='gold', linestyle='-')
-    mean = [np.mean(valuesList)]*len(monthsNames)
-    ax.plot(monthsNames, mean, label='Mean = '+"{:10.3f}".format(np.mean(valuesList))+' zl', color='red', linestyle='-')
-    plt.xticks(monthsNames, fontsize=6, rotation=60)
+        ax.plot(positions, monthsMeans, color='gold', linestyle='-')
+    mean = [totalMean]*len(monthsNames)
+    ax.plot(positions, mean, label='Mean = '+"{:10.3f}".format(totalMean)+' zl', color='red', linestyle='-')
+    ax.set_xticks(positions, monthsNames)
+    ax.tick_params(axis='x', labelsize=6, labelrotation=60)
     if len(monthsNames) > 12:
-        plt.xticks([0, len(monthsNames)], [monthsNames[0], monthsNames[-1]])
+        ax.set_xticks([0, positions[-1] + 1], [monthsNames[0], monthsNames[-1]])
     ax.legend(loc='upper right')
-    plt.savefig('img\\lastMonthsMean.png')
-    plt.clf()
-
-#This method creates and save the table of the all currency rates. 
-def preparePriceTable(valuesList, datesList, beginDate):
-    importantData = getImportantData(valuesList, datesList, beginDate)
-         
-    data = {'Date':importantData[0], 'Price':importantData[1]}
-    currencyTable = pd.DataFrame(data)
-    name = 'setup\\priceTable.csv'
-    currencyTable.to_csv(name,sep=';',index=False)
+
+#This method renders one figure to PNG bytes. It uses the Agg canvas directly instead of pyplot, so nothing is kept after the figure is saved.
+def renderFigure(figsize, draw, args):
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    draw(fig.add_subplot(), *args)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png')
+    fig.clear()
+    return buffer.getvalue()
+
+#This method renders the figure and returns the PNG bytes with the time of rendering and the process, so the profiler can record figures rendered in other processes.
+def renderTimedFigure(figsize, draw, args):
+    begin = time.perf_counter()
+    image = renderFigure(figsize, draw, args)
+    return (image, begin, time.perf_counter(), os.getpid())
+
+#This method returns the pool of processes which render figures. It's created on the first use and shared by all reports.
+def getChartPool():
+    global chartPool
+    with chartPoolLock:
+        if chartPool is None:
+            from concurrent.futures import ProcessPoolExecutor
+            chartPool = ProcessPoolExecutor(max_workers=chartProcesses)
+    return chartPool
+
+#This method renders the figures and saves them in the img directory of the report. Figures are independent, so they are rendered in parallel processes.
+def renderFigures(figures, outDir=Path('.')):
+    render = renderFigure if profiler is None else renderTimedFigure
+    if chartProcesses > 1 and len(figures) > 1:
+        pool = getChartPool()
+        images = [pool.submit(render, figsize, draw, args) for fileName, figsize, draw, args in figures]
+        images = [future.result() for future in images]
+    else:
+        images = [render(figsize, draw, args) for fileName, figsize, draw, args in figures]
+    if profiler is not None:
+        for (fileName, figsize, draw, args), (image, begin, end, pid) in zip(figures, images):
+            profiler.addEvent('figure', begin, end, {'file': fileName, 'bytes': len(image)}, pid, pid, 'figure')
+        images = [image[0] for image in images]
+    for (fileName, figsize, draw, args), image in zip(figures, images):
+        saveReportFile(outDir, 'img/' + fileName, image)
+
+chartProcesses = 1
+chartPool = None
+chartPoolLock = threading.Lock()
+figureFiles = ['wholePeriod.png', 'lastFive.png', 'lastFiveMean.png', 'lastMonths.png', 'lastMonthsMean.png']
+
+#This method prepares the figures of the report as inline SVG. The mean value lines are hidden and shown by the checkboxes of the report.
+#The points of the whole period are placed by their dates and the long periods are reduced by LTTB like the PNG figures.
+def prepareSvgFigures(stats, importantDates, lastFiveDates, monthsNames, isDecimated=True):
+    import numpy as np
+    svgFigures = {}
+    days = stats['importantDates'].astype('datetime64[D]').astype(np.int64)
+    points = selectFigurePoints(days, stats['importantValues'], isDecimated)
+    importantDates = importantDates[points]
+    importantValues = stats['importantValues'][points]
+    if len(importantDates) > 15:
+        svgFigures['fig'] = prepareSvgFigure(importantDates, importantValues, 500, False, [0, len(importantDates)-1], 45, positions=days[points])
+    else:
+        svgFigures['fig'] = prepareSvgFigure(importantDates, importantValues, 500, True, range(len(importantDates)), 45, positions=days[points])
+    lastFiveValues = stats['lastFiveValues']
+    lastFiveMean = lastFiveValues.mean() if len(lastFiveValues) > 0 else None
+    svgFigures['fig1'] = prepareSvgFigure(lastFiveDates, lastFiveValues, 500, True, range(len(lastFiveDates)), 45, lastFiveMean)
+    totalMean = stats['totalMean'] if len(monthsNames) > 0 else None
+    positions = selectFigurePoints(np.arange(len(monthsNames)), stats['monthsMeans'], isDecimated)
+    monthsMeans = np.asarray(stats['monthsMeans'])[positions]
+    monthsNames = [monthsNames[i] for i in positions]
+    if len(monthsNames) <= 12:
+        svgFigures['fig2'] = prepareSvgFigure(monthsNames, monthsMeans, 700, True, range(len(monthsNames)), 60, totalMean, positions)
+    else:
+        svgFigures['fig2'] = prepareSvgFigure(monthsNames, monthsMeans, 700, False, [0, len(monthsNames)-1], 60, totalMean, positions)
+    return svgFigures
+
+#This method draws the line figure as SVG. The points are placed at equal distances, like the text values on the x axis of matplotlib,
+#or at the given numeric positions, e.g. the numbers of days.
+def prepareSvgFigure(labels, values, height, isMarked, ticks, rotation, meanValue=None, positions=None):
+    width = 600
+    left = 75
+    right = 540
+    top = 60
+    bottom = height - 80
+    parts = ['<svg xmlns="http://www.w3.org/2000/svg" class="chart" width="%d" height="%d" viewBox="0 0 %d %d" font-family="sans-serif">' % (width, height, width, height)]
+    parts.append('<rect x="0" y="0" width="%d" height="%d" fill="white" />' % (width, height))
+    parts.append('<rect x="%d" y="%d" width="%d" height="%d" fill="none" stroke="black" />' % (left, top, right-left, bottom-top))
+    if len(values) == 0:
+        parts.append('<text x="%d" y="%d" text-anchor="middle" font-size="14">No data</text>' % ((left+right)/2, top-10))
+        parts.append('</svg>')
+        return ''.join(parts)
+    
+    yMin = min(values)
+    yMax = max(values)
+    if meanValue is not None:
+        yMin = min(yMin, meanValue)
+        yMax = max(yMax, meanValue)
+    if yMax == yMin:
+        yMin = yMin - 0.05 * abs(yMin) - 0.001
+        yMax = yMax + 0.05 * abs(yMax) + 0.001
+    margin = (yMax - yMin) * 0.05
+    yMin = yMin - margin
+    yMax = yMax + margin
+    
+    def x(i):
+        if len(values) == 1:
+            return (left + right) / 2
+        if positions is not None:
+            return left + (right - left) * (0.05 + 0.9 * (positions[i] - positions[0]) / (positions[-1] - positions[0]))
+        return left + (right - left) * (0.05 + 0.9 * i / (len(values) - 1))
+    
+    def y(value):
+        return bottom - (bottom - top) * (value - yMin) / (yMax - yMin)
+    
+    for i in range(5):
+        value = yMin + (yMax - yMin) * (i + 0.5) / 5
+        parts.append('<line x1="%d" y1="%.1f" x2="%d" y2="%.1f" stroke="black" />' % (left-4, y(value), left, y(value)))
+        parts.append('<text x="%d" y="%.1f" text-anchor="end" font-size="10">%s</text>' % (left-6, y(value)+3, "{:.3f}".format(value)))
+    for i in ticks:
+        parts.append('<line x1="%.1f" y1="%d" x2="%.1f" y2="%d" stroke="black" />' % (x(i), bottom, x(i), bottom+4))
+        parts.append('<text x="%.1f" y="%d" text-anchor="end" font-size="8" transform="rotate(-%d %.1f %d)">%s</text>' % (x(i), bottom+12, rotation, x(i), bottom+12, html.escape(str(labels[i]))))
+    
+    path = ' '.join('%s%.1f %.1f' % ('M' if i == 0 else 'L', x(i), y(values[i])) for i in range(len(values)))
+    parts.append('<path d="%s" fill="none" stroke="gold" stroke-width="1.5" />' % path)
+    if isMarked:
+        for i in range(len(values)):
+            parts.append('<circle cx="%.1f" cy="%.1f" r="3" fill="gold" />' % (x(i), y(values[i])))
+    if meanValue is not None:
+        parts.append('<g class="meanLine" style="display: none">')
+        parts.append('<line x1="%.1f" y1="%.1f" x2="%.1f" y2="%.1f" stroke="red" stroke-width="1.5" />' % (x(0), y(meanValue), x(len(values)-1), y(meanValue)))
+        parts.append('<text x="%d" y="%d" text-anchor="end" font-size="12">Mean = %s zl</text>' % (right-8, top+18, "{:10.3f}".format(meanValue).strip()))
+        parts.append('</g>')
+    parts.append('</svg>')
+    return ''.join(parts)
+
+#This method prepares the table of the all currency rates or prices of gold in the period. It's written on the disk in setup directory only if user asked for side files.
+def preparePriceTable(importantValues, importantDates, outDir=Path('.'), sideFiles=False):
+    table = {'columns':['Date', 'Price'], 'data':[importantDates, importantValues]}
+    table['formats'] = [formatTextColumn, prepareFloatColumnFormat(importantValues)]
+    if sideFiles:
+        writeCsvSideFile(table, outDir.joinpath('setup', 'priceTable.csv'))
+    return table
+
+#This method returns the cells of the text column.
+def formatTextColumn(chunk):
+    return [str(value) for value in chunk]
+
+#This method returns the function formatting the float column with the same number of decimal places in every row, like pandas does.
+def prepareFloatColumnFormat(values):
+    valueFormat = '{:.' + str(getFloatDecimals(values)) + 'f}'
+    def formatFloatColumn(chunk):
+        return [valueFormat.format(value) for value in chunk]
+    return formatFloatColumn
+
+#This method returns the smallest number of decimal places (from 1 to 6) which shows all the values.
+def getFloatDecimals(values):
+    import numpy as np
+    values = np.asarray(values, dtype=np.float64)
+    decimals = 6
+    while decimals > 1 and np.all(np.abs(np.round(values, decimals-1) - values) < 5e-7):
+        decimals = decimals - 1
+    return decimals
+
+#This method returns the rows of the table from begin to end as tuples (index, cells). Rows are formatted in chunks, so the whole table is never built in memory.
+def generateTableRows(table, begin, end, chunkSize=1000):
+    for chunkBegin in range(begin, end, chunkSize):
+        chunkEnd = min(end, chunkBegin + chunkSize)
+        columns = [table['formats'][i](table['data'][i][chunkBegin:chunkEnd]) for i in range(len(table['columns']))]
+        for i in range(chunkEnd - chunkBegin):
+            yield (chunkBegin + i, [column[i] for column in columns])
+
+#This method writes the table to the csv file.
+def writeCsvSideFile(table, fileName):
+    with open(fileName, 'w') as f:
+        f.write(';'.join(table['columns']) + '\n')
+        for index, cells in generateTableRows(table, 0, len(table['data'][0])):
+            f.write(';'.join(cells) + '\n')
 
 # ===================== End of figures and table preparation =========================
 
 # ===================== Preparation of json files and report =========================
 
-#This method prepares json file for tables. 
-def prepareTableJsonFile(fileName, formFileName, name, code):
+#This method prepares the pages of the table. With pageSize > 0 the table is split into pages of pageSize rows: fileName.html, fileName_2.html and so on.
+#Pages left by an earlier run with more pages are removed.
+def prepareTablePages(fileName, formFileName, name, code, outDir, table, data):
     personalData = {}
-    temp = pd.read_csv('setup\\'+fileName+'.csv', sep=';')
-    temp = temp.to_html()
-    personalData['table'] = temp
     if fileName == 'priceTable':
         if name == 'gold':
             personalData['name'] = name
@@ -506,15 +2386,42 @@ def prepareTableJsonFile(fileName, formFileName, name, code):
         else:
             personalData['name'] = name
             personalData['code'] = code
-    with open('setup\\generalData.json','w') as f:
-        json.dump(personalData,f,indent=4)
-        
-    prepareReport('forms',formFileName,personalData,fileName)
+    personalData['columns'] = table['columns']
+    personalData['partial'] = isReportPartial()
+    
+    rowCount = len(table['data'][0])
+    pageSize = data.pageSize if data.pageSize > 0 else max(rowCount, 1)
+    pageNames = getTablePageNames(fileName, rowCount, data.pageSize)
+    pageCount = len(pageNames)
+    for page in range(pageCount):
+        pageData = dict(personalData)
+        pageData['rows'] = generateTableRows(table, page*pageSize, min(rowCount, (page+1)*pageSize))
+        if pageCount > 1:
+            pageData['pages'] = [{'number':i+1, 'href':pageNames[i]+'.html', 'current':i == page} for i in range(pageCount)]
+        prepareReport(formFileName,pageData,pageNames[page],outDir)
+    removeExtraPages(fileName, pageCount, outDir)
+
+#This method returns the names of the pages of the table with rowCount rows: fileName, fileName_2 and so on.
+def getTablePageNames(fileName, rowCount, pageSize):
+    pageCount = max(1, -(-rowCount // pageSize)) if pageSize > 0 else 1
+    return [fileName] + [fileName + '_' + str(page+1) for page in range(1, pageCount)]
+
+#This method returns the files of the pages of the table, relative to the directory of the report, so the manifest checks all of them.
+def getTablePageFiles(fileName, rowCount, pageSize):
+    return ['forms/' + pageName + '.html' for pageName in getTablePageNames(fileName, rowCount, pageSize)]
+
+#This method removes the pages fileName_N.html with N greater than pageCount. The report in memory is always new, so it has no extra pages.
+def removeExtraPages(fileName, pageCount, outDir):
+    if isinstance(outDir, MemoryReport):
+        return
+    for page in outDir.joinpath('forms').glob(fileName + '_*.html'):
+        number = page.stem[len(fileName) + 1:]
+        if number.isdigit() and int(number) > pageCount:
+            page.unlink()
 
 #This method prepares json file for report and figures. 
-def prepareGeneralJsonFile(name, code, beginDate, endDate, beginVal, endVal, average, minVal, maxVal):
+def prepareGeneralJsonFile(name, code, beginDate, endDate, beginVal, endVal, average, minVal, maxVal, outDir, svgFigures, data):
     personalData = {}
-    prepareTableJsonFile('priceTable', 'firstForm.html', name, code)
     if name == 'gold':
         personalData['name'] = name
         personalData['code'] = 'No data'
@@ -546,33 +2453,497 @@ def prepareGeneralJsonFile(name, code, beginDate, endDate, beginVal, endVal, ave
     personalData['fig'] = '..\\img\\wholePeriod.png'
     personalData['fig1'] = '..\\img\\lastFive.png'
     personalData['fig2'] = '..\\img\\lastMonths.png'
-    with open('setup\\generalData.json','w') as f:
-        json.dump(personalData,f,indent=4)
+    personalData['partial'] = isReportPartial()
+    if svgFigures is not None:
+        personalData['svg'] = svgFigures
+    if data.sideFiles:
+        with open(outDir.joinpath('setup', 'generalData.json'),'w') as f:
+            json.dump(personalData,f,indent=4)
         
-    prepareReport('forms','secondForm.html',personalData,'report')
+    prepareReport('secondForm.html',personalData,'report',outDir)
 
 #This method creates final report.  
-def prepareReport(addTempFol,name,data,out):
-    addTempFol = Path(addTempFol).resolve()
-    loader = jinja2.FileSystemLoader(addTempFol.as_posix())
-    env = jinja2.Environment(loader=loader)
-    template = env.get_template(name)
-    htmlDoc = template.render(general=data)
-    addRep = addTempFol.joinpath(f'{out}.html')
-    with open(addRep,'w') as f:
-        f.write(htmlDoc)  
+def prepareReport(name,data,out,outDir=Path('.')):
+    with profileStage('render', template=name, out=out):
+        template = getTemplateEnvironment().get_template(name)
+        if isinstance(outDir, MemoryReport):
+            outDir['forms/' + out + '.html'] = template.render(general=data).encode('utf-8')
+            return
+        addRep = outDir.resolve().joinpath('forms', f'{out}.html')
+        with open(addRep,'w') as f:
+            template.stream(general=data).dump(f)
     print(f'Report saved to: {addRep.as_posix()}\n') 
 
+#This method saves the file of the report in the directory of the report or in memory.
+def saveReportFile(outDir, fileName, content):
+    if isinstance(outDir, MemoryReport):
+        outDir[fileName] = content
+    else:
+        with open(outDir.joinpath(fileName), 'wb') as f:
+            f.write(content)
+
+#This method creates the directories of the report. Styles and scripts are copied, when the report isn't created next to the templates.
+def prepareOutputDirectory(outDir):
+    for folder in ('forms', 'img', 'setup'):
+        outDir.joinpath(folder).mkdir(parents=True, exist_ok=True)
+    formsDir = outDir.joinpath('forms')
+    if formsDir.resolve() != templateDir.resolve():
+        for fileName in staticFiles:
+            source = templateDir.joinpath(fileName)
+            if source.is_dir():
+                shutil.copytree(source, formsDir.joinpath(fileName), dirs_exist_ok=True)
+            else:
+                shutil.copy(source, formsDir)
+
+#This method returns the environment of the templates. It's created once per process and compiled templates are kept in setup directory, so they aren't compiled again in the next run.
+def getTemplateEnvironment():
+    global templateEnvironment
+    if templateEnvironment is None:
+        import jinja2
+        templateCacheDir.mkdir(parents=True, exist_ok=True)
+        loader = jinja2.FileSystemLoader(templateDir.resolve().as_posix())
+        templateEnvironment = jinja2.Environment(loader=loader, bytecode_cache=jinja2.FileSystemBytecodeCache(templateCacheDir.resolve().as_posix()))
+    return templateEnvironment
+
+templateDir = Path('forms')
+templateCacheDir = Path('setup').joinpath('templateCache')
+templateEnvironment = None
+staticFiles = ['styles.css', 'script.js', 'Background_IMG']
+
 # ======================= End of json files and report preparation =========================
+
+# ======================= Incremental build =========================
+
+#This class keeps the digests of the inputs of every part of the report in setup/manifest.json. A part is generated again only if its digest changed or its files are missing.
+class BuildManifest:
+
+    def __init__(self, outDir, rebuild=False):
+        self.outDir = outDir
+        self.fileName = None
+        self.digests = {}
+        # Reports kept in memory are always generated.
+        if isinstance(outDir, MemoryReport):
+            return
+        self.fileName = outDir.joinpath('setup', 'manifest.json')
+        if not rebuild and self.fileName.exists():
+            try:
+                with open(self.fileName) as f:
+                    self.digests = json.load(f)
+            except ValueError:
+                self.digests = {}
+
+    #This method returns True if the part was generated from the same inputs and all its files still exist.
+    def isUpToDate(self, artefact, digest, files):
+        if self.fileName is None:
+            return False
+        isUpToDate = self.digests.get(artefact) == digest and all(self.outDir.joinpath(fileName).exists() for fileName in files)
+        countMetric('manifest.hits' if isUpToDate else 'manifest.misses')
+        return isUpToDate
+
+    def update(self, artefact, digest):
+        self.digests[artefact] = digest
+
+    #This method forgets the digests of the parts, so they are generated again by the next run.
+    def discard(self, artefacts):
+        for artefact in artefacts:
+            self.digests.pop(artefact, None)
+
+    #This method saves the manifest. The file is replaced at once, so an interrupted run never leaves a broken manifest.
+    def save(self):
+        if self.fileName is None:
+            return
+        tempName = self.fileName.with_suffix('.tmp')
+        with open(tempName, 'w') as f:
+            json.dump(self.digests, f, indent=4)
+        os.replace(tempName, self.fileName)
+
+#This method returns the digest of the given inputs.
+def hashInputs(*inputs):
+    digest = hashlib.sha256()
+    for value in inputs:
+        if not isinstance(value, bytes):
+            value = repr(value).encode('utf-8')
+        digest.update(value)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+#This method returns the modification times of the templates and of the script, because both change the generated files.
+def getTemplateStamp(names):
+    stamp = [(name, templateDir.joinpath(name).stat().st_mtime_ns) for name in names]
+    stamp.append(('baseScript.py', os.stat(__file__).st_mtime_ns))
+    return stamp
+
+# ======================= End of incremental build =========================
+
+# ======================= Batch mode =========================
+
+#This method returns True if user asked for many reports.
+def isBatchMode(args):
+    return bool(args.batch) or bool(args.jobFile)
+
+#This method prepares one report of the batch mode. The options of the report are copied from the command line.
+def prepareJob(args, argument, beginDate, endDate):
+    return argparse.Namespace(argument=prepareArgument(argument), beginDate=beginDate, endDate=endDate, charts=args.charts, pageSize=args.pageSize, sideFiles=args.sideFiles, export=args.export, rebuild=args.rebuild, codes=args.codes, stream=args.stream, noDecimation=args.noDecimation, deadline=args.deadline, partial=False)
+
+#This method prepares the list of reports from the '--batch' arguments and the job file. Every report is checked like the single one.
+def prepareBatchJobs(args):
+    jobs = []
+    for argument in args.batch or []:
+        jobs.append(prepareJob(args, argument, args.beginDate, args.endDate))
+    if args.jobFile:
+        with open(args.jobFile, encoding='utf-8') as f:
+            for line in f:
+                words = line.split('#')[0].split()
+                if len(words) == 0:
+                    continue
+                job = prepareJob(args, words[0], args.beginDate, args.endDate)
+                if len(words) > 1:
+                    job.beginDate = shiftUnpublishedDate(parseDate(words[1]))
+                if len(words) > 2:
+                    job.endDate = shiftUnpublishedDate(parseDate(words[2]))
+                jobs.append(job)
+    
+    uniqueJobs = {}
+    for job in jobs:
+        checkArguments(job)
+        uniqueJobs.setdefault(getReportKey(job), job)
+    
+    codes = [key[0] for key in uniqueJobs]
+    batchJobs = []
+    for key, job in uniqueJobs.items():
+        dirName = key[0]
+        if codes.count(key[0]) > 1:
+            dirName = dirName + '_' + key[1].isoformat() + '_' + key[2].isoformat()
+        batchJobs.append((dirName, job))
+    return batchJobs
+
+#This method returns the key of the report: the code of the currency or the option with the period. The table of all currencies doesn't depend on the period.
+def getReportKey(job):
+    if job.argument == 'all':
+        return ('all', getCatalog().publishedDay)
+    if job.argument == 'matrix':
+        return ('matrix', job.beginDate.date(), job.endDate.date())
+    return (resolveInstrument(job.argument)[1], job.beginDate.date(), job.endDate.date())
+
+#This method sets the catalog and the downloading of the process, which generates the reports in the batch mode.
+def initBatchWorker(tables, isProfiled=False, fetchSettings=None):
+    global catalog, chartProcesses, fetchEngine
+    catalog = CurrencyCatalog(tables)
+    if fetchSettings is not None:
+        fetchEngine = FetchEngine(**fetchSettings)
+    if isProfiled:
+        startProfiling()
+    # Reports are already generated in parallel, so every process renders its figures by itself.
+    chartProcesses = 1
+
+#This method generates one report of the batch mode. The data is already in the local store.
+#The report is partial if its data couldn't be downloaded before.
+#It returns the records of the profiler of the process, so they are saved with the records of the main process.
+def runBatchJob(job, outDir):
+    with profileStage('report', argument=job.argument), LatencyBudget(job.deadline) as budget:
+        budget.isPartial = job.partial
+        prepareOutputDirectory(outDir)
+        generateReport(job, outDir, sync=False)
+    if profiler is not None:
+        return profiler.takeRecords()
+
+#This method downloads the days of the reports, which aren't in the archive, to the local store.
+#The data of all reports is downloaded together within the latency budget of the batch.
+#Reports whose data couldn't be downloaded are marked as partial.
+def syncBatchRates(batchJobs):
+    requests = []
+    codes = {}
+    for dirName, job in batchJobs:
+        if job.argument not in ('all', 'matrix'):
+            name, code, letter = resolveInstrument(job.argument)
+            requests.append((letter, code, getArchiveTailBegin(code, getFetchBegin(job.beginDate, job.endDate)), job.endDate))
+            codes[dirName] = code
+    with profileStage('store.sync', reports=len(requests)):
+        failedCodes = syncRates(requests)
+    for dirName, job in batchJobs:
+        job.partial = codes.get(dirName) in failedCodes
+
+#This method generates all reports of the batch mode or the given ones. All data is downloaded first (unless sync is False), then reports are generated in parallel processes.
+#The catalog used to check the reports and the data of the reports are downloaded within one deadline.
+def runBatch(args, batchJobs=None, sync=True):
+    with LatencyBudget(args.deadline):
+        if batchJobs is None:
+            batchJobs = prepareBatchJobs(args)
+        if len(batchJobs) == 0:
+            return
+        if sync:
+            syncBatchRates(batchJobs)
+    outDir = Path(args.outDir or 'reports')
+    
+    # The matrix of currencies is downloaded by the process of its report.
+    fetchSettings = {'baseUrl': args.apiUrl, 'workers': args.workers, 'timeout': args.timeout, 'retries': args.retries, 'rateLimit': args.rateLimit}
+    from concurrent.futures import ProcessPoolExecutor
+    processes = max(1, min(args.processes or 1, len(batchJobs)))
+    with ProcessPoolExecutor(max_workers=processes, initializer=initBatchWorker, initargs=(getCatalog().tables, profiler is not None, fetchSettings)) as executor:
+        futures = [executor.submit(runBatchJob, job, outDir.joinpath(dirName)) for dirName, job in batchJobs]
+        for (dirName, job), future in zip(batchJobs, futures):
+            try:
+                records = future.result()
+            except Exception as e:
+                print("Couldn't generate the report " + dirName + "! " + str(e))
+                continue
+            if records is not None:
+                profiler.addRecords(records)
+
+# ======================= End of batch mode =========================
+
+# ======================= Update mode =========================
+
+#This method adds the fixings published since the last run to the archive and generates again the reports of the batch whose data changed.
+#Without the archive the whole history is downloaded first, like with the '--backfill' option.
+def runUpdate(args):
+    global archive
+    with profileStage('update.archive'):
+        firstNewDays = runBackfill(args)
+    archive = None
+    if not isBatchMode(args):
+        return
+    outDir = Path(args.outDir or 'reports')
+    with LatencyBudget(args.deadline):
+        batchJobs = prepareBatchJobs(args)
+        syncBatchRates(batchJobs)
+    with profileStage('update.check', reports=len(batchJobs)):
+        changedJobs = [(dirName, job) for dirName, job in batchJobs if isReportChanged(job, outDir.joinpath(dirName))]
+    countMetric('update.changed', len(changedJobs))
+    print('New days: ' + (', '.join(group + ' from ' + day.isoformat() for group, day in firstNewDays.items()) or 'none') + '. Reports to generate: ' + str(len(changedJobs)) + ' of ' + str(len(batchJobs)) + '.\n')
+    runBatch(args, changedJobs, sync=False)
+
+#This method returns False if the report of the currency or gold is up to date. Its series is read from the archive and its parts are checked
+#in the manifest of the report, so the processes of the batch are started only for the changed reports. Other reports are always generated,
+#they check their manifests by themselves.
+def isReportChanged(job, reportDir):
+    if job.argument in ('all', 'matrix') or job.stream or job.rebuild:
+        return True
+    name, code, letter = resolveInstrument(job.argument)
+    series = loadArchivedRates(letter, code, getFetchBegin(job.beginDate, job.endDate), job.endDate, sync=False)
+    manifest = BuildManifest(reportDir, job.rebuild)
+    return not all(checkReportParts(manifest, job, series, *prepareReportDigests(job, name, code, series)))
+
+# ======================= End of update mode =========================
+
+# ======================= Server mode =========================
+
+#This class keeps the files of one report in memory: the path relative to the directory of the report and the content in bytes.
+class MemoryReport(dict):
+    isPartial = False
+
+#This class is the cache of the least recently used values. It's shared by the threads of the server, so every access is locked.
+class LruCache:
+
+    def __init__(self, maxSize):
+        self.maxSize = maxSize
+        self.items = OrderedDict()
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    #This method returns the value of the key. A missing value is created by create(), threads asking for the same key wait for it instead of creating it again.
+    def getOrCreate(self, key, create):
+        while True:
+            with self.lock:
+                if key in self.items:
+                    self.items.move_to_end(key)
+                    countMetric('server.cacheHits')
+                    return self.items[key]
+                event = self.pending.get(key)
+                if event is None:
+                    countMetric('server.cacheMisses')
+                    event = threading.Event()
+                    self.pending[key] = event
+                    break
+            event.wait()
+        try:
+            value = create()
+            with self.lock:
+                self.items[key] = value
+                while len(self.items) > self.maxSize:
+                    self.items.popitem(last=False)
+            return value
+        finally:
+            with self.lock:
+                del self.pending[key]
+            event.set()
+
+    #This method removes the value of the key from the cache.
+    def discard(self, key):
+        with self.lock:
+            self.items.pop(key, None)
+
+#This class generates the reports of the server. The catalog and the templates are loaded once, the series and the reports are kept in memory.
+#Reports are available at /<currency>/<dd-mm-yyyy>/<dd-mm-yyyy>/forms/report.html and /all/forms/currencyTable.html, like in the directory of the report.
+class ReportServer:
+
+    def __init__(self, args):
+        self.args = args
+        self.reports = LruCache(args.cacheSize)
+        self.seriesByCode = {}
+        self.seriesLock = threading.Lock()
+        self.catalogLock = threading.Lock()
+        try:
+            getCatalog()
+        except FetchError as e:
+            print(str(e) + ' It will be downloaded again by the next request.')
+        getTemplateEnvironment()
+
+    #This method loads the catalog again, if it's missing or stale, so the server shows the tables published after its start.
+    #A catalog which couldn't be downloaded isn't kept, so it's downloaded again by the next request.
+    #The archive is opened again, if it was extended since the last request, so its days aren't downloaded again.
+    def refreshCatalog(self):
+        with self.catalogLock:
+            refreshArchive()
+            if catalog is not None and not isCatalogStale(catalog):
+                return
+            resetCatalog()
+            getCatalog()
+
+    #This method returns the series of the period. The longest loaded period of every code is kept in memory with its range index
+    #and reports take slices of it without copying. If only newer days are needed, they are loaded and appended to the index.
+    def loadSeries(self, letter, code, begin, end, sync=True):
+        with self.seriesLock:
+            cached = self.seriesByCode.get(code)
+        if cached is None or begin.date() < cached[0]:
+            loadBegin = begin
+            loadEnd = end
+            if cached is not None:
+                loadBegin = min(begin, datetime(cached[0].year, cached[0].month, cached[0].day))
+                loadEnd = max(end, datetime(cached[1].year, cached[1].month, cached[1].day))
+            series = loadArchivedRates(letter, code, loadBegin, loadEnd, sync)
+            # The series with missing parts isn't kept, so they are downloaded again by the next report.
+            if isReportPartial():
+                return series.sliceDays(toDayNumber(begin), toDayNumber(end))
+            series.getRangeIndex()
+            cached = (loadBegin.date(), loadEnd.date(), series)
+            with self.seriesLock:
+                self.seriesByCode[code] = cached
+        elif end.date() > cached[1]:
+            tailBegin = cached[1] + timedelta(days=1)
+            tail = loadArchivedRates(letter, code, datetime(tailBegin.year, tailBegin.month, tailBegin.day), end, sync)
+            if isReportPartial():
+                return loadArchivedRates(letter, code, begin, end, False)
+            with self.seriesLock:
+                cached = self.seriesByCode[code]
+                index = cached[2].getRangeIndex()
+                index.append(tail)
+                cached = (cached[0], max(cached[1], end.date()), index.series)
+                self.seriesByCode[code] = cached
+        return cached[2].sliceDays(toDayNumber(begin), toDayNumber(end))
+
+    #This method generates the report in memory within the latency budget of the report.
+    def prepareReport(self, job):
+        report = MemoryReport()
+        with LatencyBudget(job.deadline) as budget:
+            generateReport(job, report, loadSeries=self.loadSeries)
+        report.isPartial = budget.isPartial
+        return report
+
+    #This method returns the status, the headers and the content of the answer to the given path.
+    def handle(self, path):
+        parts = [unquote(part) for part in urlsplit(path).path.split('/') if part]
+        if len(parts) == 0:
+            return (302, {'Location': '/all/forms/currencyTable.html'}, b'')
+        for i, part in enumerate(parts):
+            if part in staticFiles:
+                return self.handleStaticFile(parts[i:])
+        if not (parts[0] == 'all' and len(parts) == 3) and not (len(parts) == 5 and parts[0] != 'all'):
+            return (404, {'Content-Type': 'text/plain; charset=utf-8'}, b'Not found')
+        try:
+            self.refreshCatalog()
+            if parts[0] == 'all':
+                job = prepareServerJob(self.args, 'all', datetime.now(), datetime.now())
+            else:
+                try:
+                    job = prepareServerJob(self.args, parts[0], shiftUnpublishedDate(parseDate(parts[1])), shiftUnpublishedDate(parseDate(parts[2])))
+                    checkArguments(job)
+                except ValueError as e:
+                    return (400, {'Content-Type': 'text/plain; charset=utf-8'}, str(e).encode('utf-8'))
+            key = getReportKey(job)
+            report = self.reports.getOrCreate(key, lambda: self.prepareReport(job))
+        except FetchError as e:
+            return (502, {'Content-Type': 'text/plain; charset=utf-8'}, str(e).encode('utf-8'))
+        # Partial reports aren't kept in the cache, so the next request tries to download the missing data again.
+        if report.isPartial:
+            self.reports.discard(key)
+        content = report.get('/'.join(parts[-2:]))
+        if content is None:
+            return (404, {'Content-Type': 'text/plain; charset=utf-8'}, b'Not found')
+        return (200, {'Content-Type': getContentType(parts[-1])}, content)
+
+    #This method returns the style, the script or the image of the reports. Only files from the directory of the templates are returned.
+    def handleStaticFile(self, parts):
+        fileName = templateDir.joinpath(*parts).resolve()
+        if templateDir.resolve() not in fileName.parents or not fileName.is_file():
+            return (404, {'Content-Type': 'text/plain; charset=utf-8'}, b'Not found')
+        with open(fileName, 'rb') as f:
+            return (200, {'Content-Type': getContentType(fileName.name)}, f.read())
+
+#This method prepares the report of the server. The options of the report are copied from the command line.
+def prepareServerJob(args, argument, beginDate, endDate):
+    return argparse.Namespace(argument=prepareArgument(argument), beginDate=beginDate, endDate=endDate, charts=args.charts, pageSize=args.pageSize, sideFiles=False, export=None, rebuild=False, codes=args.codes, stream=False, noDecimation=args.noDecimation, deadline=args.deadline, partial=False)
+
+#This method returns the content type of the file.
+def getContentType(fileName):
+    contentType = mimetypes.guess_type(fileName)[0] or 'application/octet-stream'
+    if contentType.startswith('text/'):
+        contentType = contentType + '; charset=utf-8'
+    return contentType
+
+#This method starts the server. Every request is handled in its own thread.
+def runServer(args):
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+    reportServer = ReportServer(args)
+    
+    class RequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            status, headers, content = reportServer.handle(self.path)
+            self.send_response(status)
+            for header, value in headers.items():
+                self.send_header(header, value)
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+    
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), RequestHandler)
+    print('Reports are available at: http://127.0.0.1:' + str(server.server_address[1]) + '/')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+# ======================= End of server mode =========================
     
 def main(args):
-    if not args.listOfCurrencies:
-        if args.argument == 'all':
-            prepareTableOfAllCurrencies()
-        else:
-            prepareDataForReport(args)
+    if args.serve:
+        runServer(args)
+    elif args.backfill:
+        runBackfill(args)
+    elif args.update:
+        runUpdate(args)
+    elif isBatchMode(args):
+        runBatch(args)
+    elif not args.listOfCurrencies:
+        with profileStage('report', argument=args.argument):
+            outDir = Path(args.outDir or '.')
+            prepareOutputDirectory(outDir)
+            with args.budget as budget:
+                generateReport(args, outDir)
+            if budget.isPartial:
+                print('The report is partial, because a part of its data couldn\'t be downloaded.')
 
 if __name__ == '__main__':
 
-    args = parserFunction()
-    main(args)
+    try:
+        args = parserFunction()
+        try:
+            main(args)
+        finally:
+            if profiler is not None:
+                profiler.save(args.profile)
+    except FetchError as e:
+        print(str(e))
+        sys.exit(1)
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+
+'''
+Benchmark of the currency rates script
+'''
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from fakeNbpServer import FakeNbpServer
+
+description = '''
+This script measures baseScript.py with the local stand-in of the NBP API (fakeNbpServer.py), so the results don't depend on the network.
+It checks:
+   * the import time of baseScript measured by 'python -X importtime' (the median of at least seven runs after one warm-up run),
+   * the wall-clock time of the '-l' option,
+   * the modules loaded by the '-l' option and the 'all' option,
+   * the short and the long currency report, the report of gold, the 'all' option and the '-l' option.
+For every case it prints the wall-clock time, the number of requests, the downloaded kilobytes, the peak memory of the main process
+and the peak memory of the largest child process, which renders the figures.
+Reports start with an empty local store, so all their data is downloaded in every run.
+The script returns a non-zero exit code if any limit is exceeded or a heavy module is loaded by a path which doesn't need it.
+'''
+
+scriptDir = Path(__file__).resolve().parent
+
+# The import takes about 100 ms, but single runs on a busy machine with one CPU reach 150 ms, so the median of several runs is compared
+# with the limit and the limit leaves room for this noise.
+minImportRuns = 7
+
+# Modules which must not be loaded by the given paths of the script.
+forbiddenModules = {
+    'import': ['numpy', 'matplotlib', 'jinja2'],
+    '-l': ['numpy', 'matplotlib', 'jinja2'],
+    'all': ['matplotlib'],
+}
+
+# Measured cases: name, arguments of the script and True if the local store is removed before every run.
+# The '-l' case keeps the list of currencies on the disk, so it measures only the startup of the script.
+cases = [
+    ('-l', ['-l', '-t', '86400'], False),
+    ('short', ['EUR', '-b', '01-02-2024', '-e', '29-02-2024'], True),
+    ('long', ['USD', '-b', '02-01-2014', '-e', '29-12-2023'], True),
+    ('gold', ['gold', '-b', '02-01-2023', '-e', '29-12-2023'], True),
+    ('all', ['all'], True),
+]
+
+# This code runs the script and prints the peak memory of its main process and of its largest child process in kilobytes.
+# The pool of the figures is shut down first, because only finished children are counted. The resource module is missing on Windows, then the memory isn't measured.
+memoryProbe = '''
+import runpy, sys
+sys.argv = sys.argv[1:]
+scriptGlobals = {}
+try:
+    scriptGlobals = runpy.run_path(sys.argv[0], run_name='__main__')
+finally:
+    if scriptGlobals.get('chartPool') is not None:
+        scriptGlobals['chartPool'].shutdown()
+    try:
+        import resource
+        for name, who in (('peak memory', resource.RUSAGE_SELF), ('peak child memory', resource.RUSAGE_CHILDREN)):
+            peak = resource.getrusage(who).ru_maxrss
+            if sys.platform == 'darwin':
+                peak = peak // 1024
+            sys.stderr.write(name + ': ' + str(peak) + '\\n')
+    except ImportError:
+        pass
+'''
+
+#This method handle the user input.
+def parserFunction():
+    parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=description)
+    parser.add_argument('-r', '--repeat', type=int, default=5, help=u'''Number of measured runs of every case.''')
+    parser.add_argument('-c', '--case', action='append', choices=[case[0] for case in cases], help=u'''Measures only the given case. It can be used many times.''')
+    parser.add_argument('--maxImportMs', type=float, default=250.0, help=u'''Limit of the median import time of baseScript in milliseconds.''')
+    parser.add_argument('--maxListMs', type=float, default=500.0, help=u'''Limit of the wall-clock time of the '-l' option in milliseconds.''')
+    parser.add_argument('--latency', type=float, default=0.0, help=u'''Delay of every answer of the data source in milliseconds.''')
+    parser.add_argument('--jitter', type=float, default=0.0, help=u'''Random change of the delay in milliseconds.''')
+    parser.add_argument('--errorRate', type=float, default=0.0, help=u'''Part of the requests answered with an error, from 0 to 1.''')
+    parser.add_argument('-o', '--output', help=u'''File in which the results are saved as json, so they can be compared with the next runs.''')
+    return parser.parse_args()
+
+#This method prepares the working directory with the templates, so the benchmark doesn't touch the files of the user.
+def prepareWorkDir():
+    workDir = Path(tempfile.mkdtemp(prefix='benchmark'))
+    shutil.copytree(scriptDir.joinpath('forms'), workDir.joinpath('forms'))
+    return workDir
+
+#This method removes the local store, the list of currencies and the manifest of the reports, so the next run downloads and generates everything.
+def clearWorkDir(workDir):
+    shutil.rmtree(workDir.joinpath('setup'), ignore_errors=True)
+
+#This method runs the script and returns the wall-clock time in milliseconds, the list of imported modules and the peak memory of the main process
+#and of the largest child process in kilobytes.
+def runScript(workDir, arguments, server):
+    command = [sys.executable, '-X', 'importtime', '-c', memoryProbe, str(scriptDir.joinpath('baseScript.py'))] + arguments + ['--apiUrl', server.url]
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=workDir, capture_output=True, text=True)
+    elapsed = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError('baseScript.py ' + ' '.join(arguments) + ' failed:\n' + result.stderr[-2000:])
+    return (elapsed, parseImportTime(result.stderr)[1], parsePeakMemory(result.stderr, 'peak memory:'), parsePeakMemory(result.stderr, 'peak child memory:'))
+
+#This method measures the import of baseScript. It returns the cumulative time in milliseconds and the list of imported modules.
+def measureImport(workDir):
+    command = [sys.executable, '-X', 'importtime', '-c', 'import baseScript']
+    env = dict(os.environ, PYTHONPATH=str(scriptDir))
+    result = subprocess.run(command, cwd=workDir, capture_output=True, text=True, env=env)
+    return parseImportTime(result.stderr)
+
+#This method parses the output of 'python -X importtime'.
+def parseImportTime(output):
+    modules = []
+    baseScriptTime = 0.0
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        parts = line[len('import time:'):].split('|')
+        name = parts[2].strip()
+        modules.append(name)
+        if name == 'baseScript':
+            baseScriptTime = int(parts[1]) / 1000
+    return (baseScriptTime, modules)
+
+#This method returns the peak memory printed by the memory probe after the prefix or None if it wasn't measured.
+def parsePeakMemory(output, prefix):
+    for line in output.splitlines():
+        if line.startswith(prefix):
+            return int(line[len(prefix):])
+    return None
+
+#This method returns the forbidden modules which were loaded.
+def findForbiddenModules(case, modules):
+    loaded = set(module.split('.')[0] for module in modules)
+    return [module for module in forbiddenModules.get(case, []) if module in loaded]
+
+#This method prints the result of the case and returns False if the limit is exceeded or a forbidden module is loaded.
+def reportCase(case, result, limit):
+    median = statistics.median(result['times'])
+    forbidden = findForbiddenModules(case, result['modules'])
+    isOk = (limit is None or median <= limit) and len(forbidden) == 0
+    line = '{:8s} median {:8.1f} ms  min {:8.1f} ms'.format(case, median, min(result['times']))
+    if 'requests' in result:
+        line += '  {:4d} requests {:8.1f} kB'.format(result['requests'], result['bytes'] / 1024)
+    if result.get('peakMemory') is not None:
+        line += '  peak {:6.1f} MB'.format(result['peakMemory'] / 1024)
+    if result.get('peakChildMemory'):
+        line += '  child peak {:6.1f} MB'.format(result['peakChildMemory'] / 1024)
+    if limit is not None:
+        line += '  limit {:8.1f} ms'.format(limit)
+    if len(forbidden) > 0:
+        line += '  loads ' + ', '.join(forbidden)
+    print(line + ('  OK' if isOk else '  FAILED'))
+    result['median'] = median
+    result['isOk'] = isOk
+    return isOk
+
+#This method measures one case. The requests and the bytes are counted in the last run.
+def measureCase(workDir, server, arguments, isCold, repeat):
+    result = {'times': [], 'peakMemory': None, 'peakChildMemory': None}
+    # The first run saves the list of currencies, so the '-l' case doesn't depend on the data source.
+    if not isCold:
+        runScript(workDir, arguments, server)
+    for i in range(repeat):
+        if isCold:
+            clearWorkDir(workDir)
+        server.resetStats()
+        elapsed, modules, peakMemory, peakChildMemory = runScript(workDir, arguments, server)
+        result['times'].append(elapsed)
+        result['modules'] = modules
+        if peakMemory is not None:
+            result['peakMemory'] = max(result['peakMemory'] or 0, peakMemory)
+        if peakChildMemory is not None:
+            result['peakChildMemory'] = max(result['peakChildMemory'] or 0, peakChildMemory)
+        result.update(server.getStats())
+    return result
+
+def main(args):
+    workDir = prepareWorkDir()
+    server = FakeNbpServer(latency=args.latency, jitter=args.jitter, errorRate=args.errorRate).start()
+    isOk = True
+    results = {}
+    try:
+        if args.case is None:
+            importResult = {'times': []}
+            # The first import fills the cache of the files of the modules and isn't measured.
+            measureImport(workDir)
+            for i in range(max(args.repeat, minImportRuns)):
+                importTime, importResult['modules'] = measureImport(workDir)
+                importResult['times'].append(importTime)
+            isOk = reportCase('import', importResult, args.maxImportMs) and isOk
+            results['import'] = importResult
+
+        for case, arguments, isCold in cases:
+            if args.case is not None and case not in args.case:
+                continue
+            result = measureCase(workDir, server, arguments, isCold, args.repeat)
+            isOk = reportCase(case, result, args.maxListMs if case == '-l' else None) and isOk
+            results[case] = result
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(workDir, ignore_errors=True)
+
+    if args.output:
+        for result in results.values():
+            del result['modules']
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+    return 0 if isOk else 1
+
+if __name__ == '__main__':
+
+    args = parserFunction()
+    sys.exit(main(args))
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+
+'''
+Local stand-in of the NBP API
+'''
+
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import urllib.request
+import urllib.error
+import zlib
+from functools import lru_cache
+from datetime import date
+from datetime import datetime
+from datetime import timedelta
+from http.server import ThreadingHTTPServer
+from http.server import BaseHTTPRequestHandler
+from pathlib import Path
+
+description = '''
+This script starts a local HTTP server which answers like api.nbp.pl, so baseScript.py can be run and measured without the network:
+   python fakeNbpServer.py --port 8080
+   python baseScript.py EUR -b 01-01-2024 -e 31-03-2024 --apiUrl http://127.0.0.1:8080/api/
+
+It serves:
+   * exchangerates/tables/{A|B}/[{date}|{begin}/{end}] - tables of currency rates, at most 93 days,
+   * exchangerates/rates/{a|b}/{code}/[{date}|{begin}/{end}] - rates of one currency, at most 367 days,
+   * cenyzlota/[{date}|{begin}/{end}] - prices of gold, at most 367 days.
+Rates are generated from the code and the date, so every run gets the same data. Table A and prices of gold are published on working days,
+table B on Wednesdays. Recorded answers can be served from the '--fixtures' directory instead of the generated ones.
+The latency and the rate of errors can be set to check how the script behaves with a slow or unreliable data source.
+'''
+
+# Currencies of table A and B: name, code and the average rate.
+tableA = [('bat (Tajlandia)', 'THB', 0.11), ('dolar amerykański', 'USD', 3.9), ('dolar australijski', 'AUD', 2.6), ('dolar Hongkongu', 'HKD', 0.5),
+          ('dolar kanadyjski', 'CAD', 2.9), ('dolar nowozelandzki', 'NZD', 2.4), ('dolar singapurski', 'SGD', 2.9), ('euro', 'EUR', 4.3),
+          ('forint (Węgry)', 'HUF', 0.011), ('frank szwajcarski', 'CHF', 4.4), ('funt szterling', 'GBP', 5.0), ('hrywna (Ukraina)', 'UAH', 0.1),
+          ('jen (Japonia)', 'JPY', 0.027), ('korona czeska', 'CZK', 0.17), ('korona duńska', 'DKK', 0.58), ('korona islandzka', 'ISK', 0.028),
+          ('korona norweska', 'NOK', 0.37), ('korona szwedzka', 'SEK', 0.37), ('lej rumuński', 'RON', 0.87), ('lew (Bułgaria)', 'BGN', 2.2),
+          ('lira turecka', 'TRY', 0.12), ('nowy izraelski szekel', 'ILS', 1.05), ('peso chilijskie', 'CLP', 0.0042), ('peso filipińskie', 'PHP', 0.07),
+          ('peso meksykańskie', 'MXN', 0.2), ('rand (Republika Południowej Afryki)', 'ZAR', 0.21), ('real (Brazylia)', 'BRL', 0.7),
+          ('ringgit (Malezja)', 'MYR', 0.85), ('rupia indonezyjska', 'IDR', 0.00025), ('rupia indyjska', 'INR', 0.047),
+          ('won południowokoreański', 'KRW', 0.0029), ('yuan renminbi (Chiny)', 'CNY', 0.55), ('SDR (MFW)', 'XDR', 5.2)]
+tableB = [('afgani (Afganistan)', 'AFN', 0.055), ('ariary (Madagaskar)', 'MGA', 0.00087), ('balboa (Panama)', 'PAB', 3.9), ('birr etiopski', 'ETB', 0.07),
+          ('boliwiano (Boliwia)', 'BOB', 0.57), ('colon kostarykański', 'CRC', 0.0076), ('dalasi (Gambia)', 'GMD', 0.058),
+          ('denar (Macedonia Północna)', 'MKD', 0.07), ('dinar algierski', 'DZD', 0.029), ('dinar bahrajński', 'BHD', 10.4), ('dinar iracki', 'IQD', 0.003),
+          ('dinar jordański', 'JOD', 5.5), ('dinar kuwejcki', 'KWD', 12.7), ('dinar serbski', 'RSD', 0.037), ('dinar tunezyjski', 'TND', 1.25),
+          ('dirham marokański', 'MAD', 0.39), ('dram (Armenia)', 'AMD', 0.01)]
+goldPrice = 150.0
+
+firstCurrencyDay = date(2002, 1, 2)
+firstGoldDay = date(2013, 1, 2)
+maxRatesDays = 367
+maxTablesDays = 93
+
+# Working days of the week on which the table or the price of gold is published. Nothing is published on the fixed public holidays.
+publishingWeekdays = {'A': (0, 1, 2, 3, 4), 'B': (2,), 'gold': (0, 1, 2, 3, 4)}
+holidays = [(1, 1), (1, 6), (5, 1), (5, 3), (8, 15), (11, 1), (11, 11), (12, 25), (12, 26)]
+
+#This method handle the user input.
+def parserFunction():
+    parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=description)
+    parser.add_argument('-p', '--port', type=int, default=8080, help=u'''Port of the server.''')
+    parser.add_argument('--latency', type=float, default=0.0, help=u'''Delay of every answer in milliseconds.''')
+    parser.add_argument('--jitter', type=float, default=0.0, help=u'''Random change of the delay in milliseconds.''')
+    parser.add_argument('--errorRate', type=float, default=0.0, help=u'''Part of the requests answered with '503 Service Unavailable', from 0 to 1.''')
+    parser.add_argument('--seed', type=int, default=0, help=u'''Seed of the random delays and errors.''')
+    parser.add_argument('--fixtures', help=u'''Directory with recorded answers, e.g. 'fixtures/exchangerates/rates/a/eur/2024-01-01/2024-01-31.json'.''')
+    parser.add_argument('--record', action='store_true', help=u'''Downloads the answers missing in the fixtures directory from api.nbp.pl and saves them.''')
+    parser.add_argument('-v', '--verbose', action='store_true', help=u'''Prints every request.''')
+    return parser.parse_args()
+
+#This method returns the rate of the currency or the price of gold in the given day. It depends only on the code and the date.
+def generateValue(code, average, day):
+    phase = zlib.crc32(code.encode('utf-8')) % 1000
+    t = (day - firstCurrencyDay).days
+    value = average * (1 + 0.1 * math.sin(t / 50 + phase) + 0.03 * math.sin(t / 7 + phase))
+    if code == 'gold':
+        return round(value, 2)
+    return round(value, 4)
+
+#This method returns True if the data of the day is already published. The data of the current day is published at noon.
+def isPublished(day):
+    now = datetime.now()
+    return day < now.date() or (day == now.date() and now.hour >= 12)
+
+#This method returns the days on which the table or the price of gold was published in the period.
+def getPublishingDays(table, begin, end):
+    firstDay = firstGoldDay if table == 'gold' else firstCurrencyDay
+    day = max(begin, firstDay)
+    days = []
+    while day <= end and isPublished(day):
+        if isPublishingDay(table, day):
+            days.append(day)
+        day = day + timedelta(days=1)
+    return days
+
+#This method returns True if the table or the price of gold is published on the given day.
+def isPublishingDay(table, day):
+    return day.weekday() in publishingWeekdays[table] and (day.month, day.day) not in holidays
+
+#This method returns the number of the table, e.g. '015/A/NBP/2024'.
+@lru_cache(maxsize=None)
+def getTableNumber(table, day):
+    if day.month == 1 and day.day == 1:
+        count = 0
+    else:
+        count = int(getTableNumber(table, day - timedelta(days=1)).split('/')[0])
+    if isPublishingDay(table, day):
+        count = count + 1
+    return '{:03d}/{}/NBP/{}'.format(count, table, day.year)
+
+#This exception is turned into the error answer of the server.
+class ApiError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+#This method returns the period of the request: the current data, one day or the period from begin to end.
+def parsePeriod(words, table, limit):
+    try:
+        days = [date.fromisoformat(word) for word in words if word != 'today']
+    except ValueError:
+        raise ApiError(400, '400 BadRequest - Błędny zakres dat / Invalid date range')
+    if len(words) == 0:
+        today = date.today()
+        lastDays = getPublishingDays(table, today - timedelta(days=14), today)
+        if len(lastDays) == 0:
+            raise ApiError(404, '404 NotFound - Not Found - Brak danych')
+        return (lastDays[-1], lastDays[-1])
+    if words == ['today']:
+        return (date.today(), date.today())
+    if len(days) == 1:
+        return (days[0], days[0])
+    if len(days) == 2:
+        if days[1] < days[0]:
+            raise ApiError(400, '400 BadRequest - Błędny zakres dat / Invalid date range')
+        if (days[1] - days[0]).days + 1 > limit:
+            raise ApiError(400, '400 BadRequest - Przekroczony limit {} dni / Limit of {} days has been exceeded'.format(limit, limit))
+        return (days[0], days[1])
+    raise ApiError(400, '400 BadRequest - Nieprawidłowe zapytanie / Bad request')
+
+#This method returns the answer of cenyzlota endpoint.
+def answerGold(words):
+    begin, end = parsePeriod(words, 'gold', maxRatesDays)
+    return [{'data': day.isoformat(), 'cena': generateValue('gold', goldPrice, day)} for day in getPublishingDays('gold', begin, end)]
+
+#This method returns the answer of exchangerates/tables endpoint.
+def answerTables(words):
+    table = words[0].upper()
+    if table not in ('A', 'B'):
+        raise ApiError(400, '400 BadRequest - Nieprawidłowy typ tabeli / Invalid table type')
+    currencies = tableA if table == 'A' else tableB
+    begin, end = parsePeriod(words[1:], table, maxTablesDays)
+    answer = []
+    for day in getPublishingDays(table, begin, end):
+        rates = [{'currency': name, 'code': code, 'mid': generateValue(code, average, day)} for name, code, average in currencies]
+        answer.append({'table': table, 'no': getTableNumber(table, day), 'effectiveDate': day.isoformat(), 'rates': rates})
+    return answer
+
+#This method returns the answer of exchangerates/rates endpoint.
+def answerRates(words):
+    table = words[0].upper()
+    if table not in ('A', 'B') or len(words) < 2:
+        raise ApiError(400, '400 BadRequest - Nieprawidłowy typ tabeli / Invalid table type')
+    currencies = tableA if table == 'A' else tableB
+    found = [currency for currency in currencies if currency[1] == words[1].upper()]
+    if len(found) == 0:
+        raise ApiError(404, '404 NotFound - Not Found - Brak danych')
+    name, code, average = found[0]
+    begin, end = parsePeriod(words[2:], table, maxRatesDays)
+    rates = [{'no': getTableNumber(table, day), 'effectiveDate': day.isoformat(), 'mid': generateValue(code, average, day)} for day in getPublishingDays(table, begin, end)]
+    return {'table': table, 'currency': name, 'code': code, 'rates': rates}
+
+#This class is the server. It counts the requests and the sent bytes, so the benchmark can check how much the script downloads.
+class FakeNbpServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.0, jitter=0.0, errorRate=0.0, seed=0, fixtures=None, record=False, verbose=False):
+        super().__init__(('127.0.0.1', port), FakeNbpHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.errorRate = errorRate
+        self.fixtures = Path(fixtures) if fixtures else None
+        self.record = record
+        self.verbose = verbose
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes = 0
+
+    #This method returns the address of the API, which is passed to baseScript.py.
+    @property
+    def url(self):
+        return 'http://127.0.0.1:' + str(self.server_address[1]) + '/api/'
+
+    #This method starts the server in the background thread.
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    #This method returns the number of requests and sent bytes since the last reset.
+    def getStats(self):
+        with self.lock:
+            return {'requests': self.requests, 'bytes': self.bytes}
+
+    def resetStats(self):
+        with self.lock:
+            self.requests = 0
+            self.bytes = 0
+
+    def countAnswer(self, size):
+        with self.lock:
+            self.requests = self.requests + 1
+            self.bytes = self.bytes + size
+
+    #This method returns the delay of the answer in seconds and True if the answer should be an error.
+    def drawDelayAndError(self):
+        with self.lock:
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)) / 1000
+            isError = self.random.random() < self.errorRate
+        return (delay, isError)
+
+    #This method returns the status and the body of the answer for the path after '/api/'.
+    def answer(self, words):
+        fixture = self.readFixture(words)
+        if fixture is not None:
+            return (200, fixture)
+        try:
+            if len(words) > 0 and words[0] == 'cenyzlota':
+                body = answerGold(words[1:])
+            elif len(words) > 2 and words[:2] == ['exchangerates', 'tables']:
+                body = answerTables(words[2:])
+            elif len(words) > 2 and words[:2] == ['exchangerates', 'rates']:
+                body = answerRates(words[2:])
+            else:
+                raise ApiError(400, '400 BadRequest - Nieprawidłowe zapytanie / Bad request')
+        except ApiError as e:
+            return (e.status, e.message.encode('utf-8'))
+        if len(body) == 0 or (isinstance(body, dict) and len(body['rates']) == 0):
+            return (404, '404 NotFound - Not Found - Brak danych'.encode('utf-8'))
+        return (200, json.dumps(body, ensure_ascii=False).encode('utf-8'))
+
+    #This method returns the recorded answer. With record=True a missing answer is downloaded from api.nbp.pl and saved.
+    def readFixture(self, words):
+        if self.fixtures is None or len(words) == 0:
+            return None
+        fileName = self.fixtures.joinpath(*words).with_suffix('.json')
+        if fileName.exists():
+            return fileName.read_bytes()
+        if not self.record:
+            return None
+        request = urllib.request.Request('http://api.nbp.pl/api/' + '/'.join(words) + '/', headers={'Accept': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                body = response.read()
+        except urllib.error.HTTPError:
+            return None
+        fileName.parent.mkdir(parents=True, exist_ok=True)
+        fileName.write_bytes(body)
+        return body
+
+#This class answers the requests. Connections are kept alive like by api.nbp.pl.
+class FakeNbpHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        words = [word for word in self.path.split('?')[0].split('/') if word]
+        delay, isError = self.server.drawDelayAndError()
+        if delay > 0:
+            time.sleep(delay)
+        if isError:
+            status, body = (503, b'503 Service Unavailable')
+        elif len(words) == 0 or words[0] != 'api':
+            status, body = (404, b'404 NotFound')
+        else:
+            status, body = self.server.answer(words[1:])
+        self.server.countAnswer(len(body))
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8' if status == 200 else 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+def main(args):
+    server = FakeNbpServer(args.port, args.latency, args.jitter, args.errorRate, args.seed, args.fixtures, args.record, args.verbose)
+    print('Fake NBP API is available at: ' + server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+
+    args = parserFunction()
+    main(args)
@@ -3,7 +3,10 @@ window.addEventListener('load', () => {
 	const lastMonthCheck = document.getElementById('lastMonthCheck');
 
 	lastWeekCheck.addEventListener("change", e => {
-		if(lastWeekCheck.checked){
+		const meanLine = document.querySelector('#lastWeekDiv .meanLine');
+		if(meanLine){
+			meanLine.style.display = lastWeekCheck.checked ? 'inline' : 'none';
+		} else if(lastWeekCheck.checked){
 			document.getElementById('lastWeekDiv').innerHTML = "<img src='../img/lastFiveMean.png' />";
 		} else {
 			document.getElementById('lastWeekDiv').innerHTML = "<img src='../img/lastFive.png' />";
@@ -11,7 +14,10 @@ window.addEventListener('load', () => {
 	});
 
 	lastMonthCheck.addEventListener("change", e => {
-		if(lastMonthCheck.checked){
+		const meanLine = document.querySelector('#lastMonthsDiv .meanLine');
+		if(meanLine){
+			meanLine.style.display = lastMonthCheck.checked ? 'inline' : 'none';
+		} else if(lastMonthCheck.checked){
 			document.getElementById('lastMonthsDiv').innerHTML = "<img src='../img/lastMonthsMean.png' />";
 		} else {
 			document.getElementById('lastMonthsDiv').innerHTML = "<img src='../img/lastMonths.png' />";